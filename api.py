@@ -0,0 +1,204 @@
+# api.py
+"""HTTP API for the assistant, for the department website and other clients.
+
+    uvicorn api:app --workers 4
+
+Uses the same accounts and chat history as the Streamlit app. Answers are
+streamed as Server-Sent Events from POST /api/chat.
+"""
+import asyncio
+import datetime
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from backends.ai_backend import get_engine, shutdown_engine
+from utils.auth_utils import authenticate_user, client_address, register_user, LoginThrottled
+from utils.db_utils import init_db, get_user_messages_page, save_message_async, clear_user_messages, flush_messages
+from utils import telemetry
+from utils.session_store import sessions
+
+MAX_INFLIGHT_GENERATIONS = int(os.getenv('API_MAX_INFLIGHT', '16'))
+QUEUE_TIMEOUT = float(os.getenv('API_QUEUE_TIMEOUT', '10'))
+SHUTDOWN_GRACE = float(os.getenv('API_SHUTDOWN_GRACE', '30'))
+TOKEN_TTL = int(os.getenv('API_TOKEN_TTL', str(7 * 24 * 3600)))
+# Earlier messages handed to the conversation memory with each question
+MEMORY_MESSAGES = int(os.getenv('MEMORY_RECENT_MESSAGES', '4'))
+
+
+class Credentials(BaseModel):
+    username: str
+    password: str
+
+
+class Registration(BaseModel):
+    name: str
+    email: str
+    phone: Optional[str] = None
+    username: str
+    password: str
+
+
+class Question(BaseModel):
+    question: str
+
+
+class ServiceState:
+    def __init__(self):
+        self.generations = asyncio.Semaphore(MAX_INFLIGHT_GENERATIONS)
+        self.inflight = 0
+        self.draining = False
+
+    def release(self):
+        self.inflight -= 1
+        self.generations.release()
+
+
+class GenerationResponse(StreamingResponse):
+    """An answer stream holding a generation slot; the slot is released when the response
+    ends, including when the client is gone before the stream was ever iterated."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            state.release()
+
+
+state = ServiceState()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    if os.getenv('API_WARM_ENGINE', '1') == '1':
+        await run_in_threadpool(get_engine)
+    yield
+    # Stop taking new questions and let the ones being answered finish
+    state.draining = True
+    deadline = time.monotonic() + SHUTDOWN_GRACE
+    while state.inflight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    await run_in_threadpool(flush_messages, None, SHUTDOWN_GRACE)
+    shutdown_engine()
+
+
+app = FastAPI(title="CSC Dept. AI Chat Assistant", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[origin for origin in os.getenv('API_CORS_ORIGINS', '').split(',') if origin],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+def current_user(authorization: str = Header(default="")) -> str:
+    username = sessions.validate(authorization.removeprefix("Bearer ").strip())
+    if not username:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return username
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/health")
+async def health():
+    return {"status": "draining" if state.draining else "ok", "inflight": state.inflight}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latency histograms in the Prometheus text format (TELEMETRY=prometheus)"""
+    text = telemetry.prometheus_text()
+    if text is None:
+        raise HTTPException(status_code=404, detail="Prometheus metrics are not enabled")
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@app.post("/api/register", status_code=201)
+async def register(registration: Registration):
+    created = await run_in_threadpool(
+        register_user, registration.name, registration.email, registration.phone,
+        registration.username, registration.password,
+    )
+    if not created:
+        raise HTTPException(status_code=409, detail="Username or email already exists")
+    return {"username": registration.username}
+
+
+@app.post("/api/login")
+async def login(credentials: Credentials, request: Request):
+    peer = request.client.host if request.client else None
+    client = client_address(peer, request.headers.get("x-forwarded-for", ""))
+    try:
+        authenticated = await run_in_threadpool(authenticate_user, credentials.username, credentials.password, client)
+    except LoginThrottled as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    if not authenticated:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    token = await run_in_threadpool(sessions.create, credentials.username, TOKEN_TTL)
+    return {"token": token, "expires_in": TOKEN_TTL}
+
+
+@app.post("/api/logout", status_code=204)
+async def logout(authorization: str = Header(default=""), username: str = Depends(current_user)):
+    await run_in_threadpool(sessions.revoke, authorization.removeprefix("Bearer ").strip())
+
+
+@app.get("/api/messages")
+async def messages(before_id: Optional[int] = None, limit: int = 50, username: str = Depends(current_user)):
+    page, has_older = await run_in_threadpool(get_user_messages_page, username, before_id, min(max(limit, 1), 200))
+    return {"messages": page, "has_older": has_older}
+
+
+@app.delete("/api/messages", status_code=204)
+async def clear_messages(username: str = Depends(current_user)):
+    await run_in_threadpool(clear_user_messages, username)
+
+
+@app.post("/api/chat")
+async def chat(question: Question, username: str = Depends(current_user)):
+    if state.draining:
+        raise HTTPException(status_code=503, detail="Server is shutting down")
+    try:
+        await asyncio.wait_for(state.generations.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many questions in progress, try again shortly",
+                            headers={"Retry-After": "5"})
+    state.inflight += 1
+
+    async def stream():
+        answer = ""
+        try:
+            timestamp = datetime.datetime.now().strftime("%H:%M")
+            recent, _ = await run_in_threadpool(get_user_messages_page, username, None, MEMORY_MESSAGES)
+            save_message_async(username, "user", question.question, timestamp)
+            engine = await run_in_threadpool(get_engine)
+            async for chunk in engine.astream_answer(question.question, username=username, messages=recent):
+                answer += chunk
+                yield sse("token", chunk)
+            save_message_async(username, "assistant", answer, timestamp)
+            engine.memory.update_async(username)
+            yield sse("done", {"answer": answer, "timestamp": timestamp})
+        except Exception as e:
+            yield sse("error", {"detail": str(e)})
+
+    return GenerationResponse(stream(), media_type="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api:app", host=os.getenv('API_HOST', '127.0.0.1'), port=int(os.getenv('API_PORT', '8000')),
+                workers=int(os.getenv('API_WORKERS', '1')), timeout_graceful_shutdown=int(SHUTDOWN_GRACE))
@@ -1,7 +1,8 @@
 # app.py
 import streamlit as st
-import os
+import streamlit.components.v1 as components
 from utils.db_utils import init_db
+from utils.session_store import sessions
 from pages import login_page, register_page, chat_page
 
 # Initialize the database
@@ -35,24 +36,48 @@ def manage_sidebar_visibility():
         )
 
 # Session management
-def check_authentication_from_cookie():
-    """Check if user session exists in cookie and restore session if it does"""
-    # Use Streamlit's session state as a simple persistence mechanism
-    if os.path.exists(".session_cookie"):
-        try:
-            with open(".session_cookie", "r") as f:
-                username = f.read().strip()
-                if username:
-                    st.session_state['authenticated'] = True
-                    st.session_state['username'] = username
-        except:
-            pass  # If there's any error, just proceed without authentication
+# The login survives a reload in this cookie; the token never goes in the URL
+SESSION_COOKIE = "chat_session"
 
-def save_authentication_to_cookie():
-    """Save authentication status to a cookie"""
-    if st.session_state.get('authenticated', False):
-        with open(".session_cookie", "w") as f:
-            f.write(st.session_state['username'])
+def write_session_cookie(token):
+    """Set the session cookie, or delete it when token is None.
+
+    Streamlit can't send Set-Cookie headers, so a zero-height component sets it
+    on the app's document instead.
+    """
+    max_age = sessions.ttl if token else 0
+    components.html(f"""
+        <script>
+        const secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+        window.parent.document.cookie = "{SESSION_COOKIE}={token or ''}; Path=/; Max-Age={max_age}; SameSite=Strict" + secure;
+        </script>
+    """, height=0)
+
+def restore_session():
+    """Resume the session from this browser's cookie, or end a session that expired or was revoked"""
+    # Older links carried the token in ?session=; take it out of the address bar without using it
+    st.query_params.pop("session", None)
+    token = st.session_state.get('session_token')
+    if token is None and 'cookie_token' not in st.session_state:
+        # A new browser session: the cookie arrives with the connection. A signed-in tab
+        # never picks up a token from elsewhere, so it can't be switched to another account
+        token = st.session_state['cookie_token'] = st.context.cookies.get(SESSION_COOKIE)
+    username = sessions.validate(token)
+    if username:
+        st.session_state['authenticated'] = True
+        st.session_state['username'] = username
+        st.session_state['session_token'] = token
+    elif token:
+        # Expired or revoked: drop the stale token and the login with it
+        st.session_state.pop('authenticated', None)
+        st.session_state.pop('session_token', None)
+
+def bind_session_to_browser():
+    """Keep the cookie in step with the login: set it after signing in, delete it after signing out"""
+    token = st.session_state.get('session_token') if st.session_state.get('authenticated', False) else None
+    if st.session_state.get('cookie_token') != token:
+        write_session_cookie(token)
+        st.session_state['cookie_token'] = token
 
 # Main app logic
 def main():
@@ -61,7 +86,7 @@ def main():
         st.session_state.page = 'login'
     
     # Check if user has a valid session
-    check_authentication_from_cookie()
+    restore_session()
     
     # Manage sidebar visibility (hide on login/register)
     manage_sidebar_visibility()
@@ -75,8 +100,8 @@ def main():
     else:
         chat_page.show()
     
-    # Save authentication status after rendering
-    save_authentication_to_cookie()
+    # Bind the session to this browser after rendering
+    bind_session_to_browser()
 
 if __name__ == "__main__":
     # Add custom CSS
@@ -1,57 +1,202 @@
+import asyncio
 import hashlib
+import json
 import os
-from typing import Generator, Union, List, AsyncIterator, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, Union, List, AsyncIterator, Dict, Any, Optional
 from langchain_community.document_loaders import Docx2txtLoader
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_cohere import CohereEmbeddings
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from dotenv import load_dotenv
+from utils import telemetry
+from utils.db_utils import get_cached_response, save_cached_response
+from .response_cache import normalize_question, response_cache_key
+from .coalesce import SingleFlight
+from .context_packing import ContextPacker
+from .lexical import BM25Index
+from .memory import ConversationMemory, count_tokens
+from .numpy_store import NumpyVectorStore
+from .registry import create_llm, create_embeddings
+from .resilience import ResilientEmbeddings, call_with_retries, get_breaker, resilient_astream, LLM_TIMEOUT
+from .router import SMALL, SMALL_MODELS, ModelRouter
+from .scope_gate import NOT_FOUND_RESPONSE, OUT_OF_SCOPE_RESPONSE, ScopeGate
+from .semantic_cache import QueryEmbeddingMemo, SemanticCache, replay_answer
 load_dotenv()
 
-def get_context(retriever, question):
-    relevant_docs = retriever.invoke(question)
-    return format_docs(relevant_docs)
+def get_context(retriever, question, packer=None):
+    with telemetry.timed("retrieval") as stage:
+        relevant_docs = retriever.invoke(question)
+        stage.set("docs", len(relevant_docs))
+    if packer is None:
+        return format_docs(relevant_docs)
+    with telemetry.timed("context_packing") as stage:
+        packed = packer.pack(relevant_docs)
+        stage.set("tokens", packed.tokens)
+        stage.set("tokens_saved", packed.tokens_saved)
+    return packed.text
 
-def process_input(input_dict: Dict[str, Any], retriever) -> Dict[str, Any]:
+def process_input(input_dict: Dict[str, Any], retriever, packer=None) -> Dict[str, Any]:
     return {
-        "context": get_context(retriever, input_dict["question"]),
+        "context": get_context(retriever, input_dict["question"], packer),
         "question": input_dict["question"],
+        "history": input_dict.get("history", ""),
     }
 
 class InputProcessor:
-    def __init__(self, retriever):
+    def __init__(self, retriever, packer=None):
         self.retriever = retriever
+        self.packer = packer
 
     def __call__(self, input_dict: Dict[str, Any]) -> Dict[str, Any]:
-        return process_input(input_dict, self.retriever)
+        return process_input(input_dict, self.retriever, self.packer)
 
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Merge ranked lists by summing 1 / (rrf_k + rank) per document"""
+    scores: Dict[str, float] = {}
+    by_content: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            by_content.setdefault(doc.page_content, doc)
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + 1.0 / (rrf_k + rank + 1)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [by_content[content] for content in ranked]
+
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+class HybridRetriever(BaseRetriever):
+    """Runs BM25 and vector search concurrently and fuses them with RRF.
+
+    Falls back to BM25 alone when the vector search (i.e. the embedding call)
+    fails or exceeds `vector_timeout`, and keeps skipping it for
+    `vector_cooldown` seconds afterwards.
+    """
+
+    lexical_index: Any
+    vector_retriever: Optional[Any] = None
+    k: int = 5
+    rrf_k: int = 60
+    vector_timeout: float = 2.0
+    vector_cooldown: float = 30.0
+    vector_down_until: float = 0.0
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        use_vector = self.vector_retriever is not None and time.monotonic() >= self.vector_down_until
+        vector_future = _retrieval_pool.submit(self.vector_retriever.invoke, query) if use_vector else None
+        lexical_docs = [doc for doc, _ in self.lexical_index.search(query, self.k)]
+        if vector_future is None:
+            return lexical_docs
+        try:
+            vector_docs = vector_future.result(timeout=self.vector_timeout)
+        except Exception:
+            vector_future.cancel()
+            self.vector_down_until = time.monotonic() + self.vector_cooldown
+            return lexical_docs
+        return reciprocal_rank_fusion([lexical_docs, vector_docs], self.k, self.rrf_k)
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+INDEX_MANIFEST = "index_manifest.json"
+# CORPUS_DIR documents (backends/ingest.py) are kept apart from the data.docx index, which
+# stays in Chroma's default collection, so switching between the two never mixes them
+CORPUS_COLLECTION = "corpus"
+
+# Replies while the model provider is unreachable (see backends/resilience.py); never cached
+DEGRADED_RESPONSE = ("I can't reach the AI service right now, so here is the most relevant information I found "
+                     "about your question:\n\n{passage}\n\nPlease try again in a minute for a full answer.")
+UNAVAILABLE_RESPONSE = "I can't reach the AI service right now. Please try again in a minute."
+INTERRUPTED_NOTE = "\n\n_(This answer was cut short because the AI service stopped responding. Please try again.)_"
+
 def load_and_process_document(file_path: str):
     loader = Docx2txtLoader(file_path)
     documents = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     return text_splitter.split_documents(documents)
 
+def file_digest(file_path: str) -> str:
+    """Hash the raw bytes of a source file."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_digest(chunk) -> str:
+    """Content address of a chunk, used as its id in the vector store."""
+    return hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+
+def corpus_digest(chunk_ids: List[str]) -> str:
+    """Short version string for a set of chunk ids."""
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()[:16]
+
+def load_index_manifest(persist_directory: str, name: str = INDEX_MANIFEST) -> Union[Dict[str, Any], None]:
+    try:
+        with open(os.path.join(persist_directory, name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_index_manifest(persist_directory: str, manifest: Dict[str, Any], name: str = INDEX_MANIFEST):
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def sync_vectorstore(vectorstore, chunks) -> Dict[str, int]:
+    """Make the store hold exactly `chunks`, embedding only the ones it lacks."""
+    wanted = {}
+    for chunk in chunks:
+        wanted.setdefault(chunk_digest(chunk), chunk)
+    existing = set(vectorstore.get(include=[])["ids"])
+    new_ids = [chunk_id for chunk_id in wanted if chunk_id not in existing]
+    stale_ids = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+    if new_ids:
+        vectorstore.add_documents([wanted[chunk_id] for chunk_id in new_ids], ids=new_ids)
+    return {"added": len(new_ids), "removed": len(stale_ids), "kept": len(wanted) - len(new_ids)}
+
 class ChatAI():
-    def __init__(self):
+    def __init__(self, llm=None, embeddings_model=None, persist_directory="./chroma_db"):
         self.file_path = os.path.join(os.path.dirname(__file__), "data.docx")
+        # When set, the index is maintained by `python -m backends.ingest` instead of at startup
+        self.corpus_dir = os.getenv('CORPUS_DIR')
+
+        self.persist_directory = persist_directory
+        # "chroma" or "numpy" (memory-mapped matrix, see backends/numpy_store.py)
+        self.vector_store_type = os.getenv('VECTOR_STORE', 'chroma')
+        self.quantize_vectors = os.getenv('VECTOR_STORE_QUANTIZE', '') == '1'
 
         self.vectorstore = None
         self.chunks = None
+        self.corpus_version = None
+        self._manifest_mtime = None
+        self._chroma_system = None
 
-        self.llm = ChatGroq(
-            groq_api_key=os.getenv('GROQ_API_KEY'),
-            model="llama3-70b-8192",
-        )
-        self.embeddings_model = CohereEmbeddings(
-            cohere_api_key=os.getenv('COHERE_API_KEY'),
-            model="embed-english-v3.0",
-        )
+        # Backends come from LLM_BACKEND / EMBEDDINGS_BACKEND (see backends/registry.py)
+        custom_llm = llm is not None
+        if llm is None:
+            llm, self.model_name = create_llm()
+        else:
+            self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        self.llm = llm
+        if embeddings_model is None:
+            embeddings_model, self.embedding_model_name = create_embeddings()
+        else:
+            self.embedding_model_name = getattr(embeddings_model, "model", None) or type(embeddings_model).__name__
+        # Embedding calls get a deadline, retries and a breaker, and are timed when TELEMETRY is set;
+        # recent query vectors are reused by the caches, the scope gate and retrieval
+        self.embeddings_model = QueryEmbeddingMemo(telemetry.instrument_embeddings(
+            ResilientEmbeddings(embeddings_model, self.embedding_model_name), self.embedding_model_name))
 
         self.prompt_template = """
             You are an AI assistant for the Computer Science Department of Akanu Ibiam Federal Polytechnic Unwana.
@@ -65,45 +210,244 @@ class ChatAI():
             Retrieved Context:
             {context}
 
+            Conversation so far:
+            {history}
+
             Question:
             {question}
 
             Instructions:
             - If the question relates to the Computer Science Department at Akanu Ibiam Federal Polytechnic Unwana, provide a direct, informative answer based solely on the context.
-            - If the answer isn't found in the context, respond with: "Based on my information about the Computer Science Department at Akanu Ibiam Federal Polytechnic Unwana, I don't have specific details about that. You may want to contact the department directly for more information."
-            - If the question is completely unrelated to the Computer Science Department or Akanu Ibiam Federal Polytechnic, respond with: "I'm specifically designed to answer questions about the Computer Science Department at Akanu Ibiam Federal Polytechnic Unwana. Your question appears to be outside that scope. Is there something specific about the department or institution I can help you with?"
+            - If the answer isn't found in the context, respond with: \"""" + NOT_FOUND_RESPONSE + """"
+            - If the question is completely unrelated to the Computer Science Department or Akanu Ibiam Federal Polytechnic, respond with: \"""" + OUT_OF_SCOPE_RESPONSE + """"
 
             Please provide a helpful response based on these guidelines.
             """
-        self.k = 5
+        self.prompt = ChatPromptTemplate.from_template(self.prompt_template)
+
+        # Retrieval settings; mode is "vector", "hybrid" or "lexical",
+        # search_type is "similarity", "mmr" or "similarity_score_threshold"
+        self.retrieval_mode = os.getenv('RETRIEVAL_MODE', 'hybrid')
+        self.k = int(os.getenv('RETRIEVAL_K', '5'))
+        self.search_type = os.getenv('RETRIEVAL_SEARCH_TYPE', 'similarity')
+        self.fetch_k = int(os.getenv('RETRIEVAL_FETCH_K', '20'))
+        self.lambda_mult = float(os.getenv('RETRIEVAL_LAMBDA_MULT', '0.5'))
+        self.score_threshold = float(os.getenv('RETRIEVAL_SCORE_THRESHOLD', '0.3'))
+        self.vector_timeout = float(os.getenv('RETRIEVAL_VECTOR_TIMEOUT', '2.0'))
+        # Retrieved chunks are merged, deduplicated and cut to CONTEXT_TOKEN_BUDGET tokens
+        self.context_packer = ContextPacker(token_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500')))
+        self._lexical_index = None
+        self._qa_chains = {}  # id(llm) -> (config, chain)
+        # Out-of-scope / unanswerable questions get the canned replies without an LLM call
+        self.scope_gate_enabled = os.getenv('SCOPE_GATE', '0') == '1'
+        self._scope_gate = None
+        self._scope_gate_config = None
+        self.semantic_cache = SemanticCache(
+            self.embeddings_model,
+            threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92')),
+            max_entries=int(os.getenv('SEMANTIC_CACHE_SIZE', '256')),
+            ttl=float(os.getenv('SEMANTIC_CACHE_TTL', '3600')),
+        )
+        # Identical questions asked at the same time share one generation
+        self.single_flight = SingleFlight()
         self.initialize_resources()
+        # ROUTER=1 sends simple lookups to a smaller model (see backends/router.py)
+        self.router = self.create_router() if os.getenv('ROUTER', '0') == '1' else None
+        # Summary plus recent turns for follow-ups, capped at MEMORY_TOKEN_BUDGET tokens
+        memory_llm, memory_model_name = self.memory_model(custom_llm)
+        self.memory = ConversationMemory(
+            memory_llm,
+            token_budget=int(os.getenv('MEMORY_TOKEN_BUDGET', '600')),
+            recent_messages=int(os.getenv('MEMORY_RECENT_MESSAGES', '4')),
+            fold_after=int(os.getenv('MEMORY_FOLD_AFTER', '6')),
+            breaker=get_breaker(f"llm:{memory_model_name}"),
+        )
+
+    def close(self):
+        """Release the engine's background threads, and the corpus store's Chroma client, once
+        its running generations have finished"""
+        self.single_flight.close(self._release_vectorstore)
+        self.memory.close()
+
+    def _release_vectorstore(self):
+        """Stop the Chroma System open_vectorstore started for the corpus (see there)"""
+        # The data.docx store's System is shared with engines opened after this one, so only
+        # the corpus store has one of its own
+        system, self._chroma_system = self._chroma_system, None
+        if system is None:
+            return
+        from chromadb.api.shared_system_client import SharedSystemClient
+        if SharedSystemClient._identifier_to_system.get(self.persist_directory) is system:
+            SharedSystemClient._identifier_to_system.pop(self.persist_directory)
+        try:
+            system.stop()
+        except Exception as e:
+            print(f"Closing the vector store failed: {e}")
 
     def initialize_resources(self):
-        """Initialize document chunks and vectorstore once at startup"""
+        """Open the persisted index, re-embedding only chunks that changed since the last run"""
+        if self.vectorstore is not None:
+            return
+
+        self.vectorstore = self.open_vectorstore()
+
+        if self.corpus_dir:
+            self._open_ingested_corpus()
+            return
+
+        signature = {
+            "source_hash": file_digest(self.file_path),
+            "vector_store": self.vector_store_type,
+            "embedding_model": self.embedding_model_name,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+        }
+        manifest = load_index_manifest(self.persist_directory)
+        if (manifest and all(manifest.get(key) == value for key, value in signature.items())
+                and manifest.get("chunks") == len(self.vectorstore.get(include=[])["ids"])):
+            # Nothing changed: reuse the persisted embeddings without touching the document
+            self.corpus_version = manifest["corpus_version"]
+            return
+
+        if manifest and manifest.get("embedding_model") != self.embedding_model_name:
+            # Vectors from another model are not comparable, start over
+            self.vectorstore.reset_collection()
+
+        self.chunks = load_and_process_document(self.file_path)
+        sync_vectorstore(self.vectorstore, self.chunks)
+        chunk_ids = list({chunk_digest(chunk) for chunk in self.chunks})
+        self.corpus_version = corpus_digest(chunk_ids)
+        save_index_manifest(self.persist_directory,
+                            dict(signature, corpus_version=self.corpus_version, chunks=len(chunk_ids)))
+
+    def open_vectorstore(self):
+        if self.vector_store_type == "numpy":
+            return NumpyVectorStore(
+                self.embeddings_model,
+                os.path.join(self.persist_directory, f"numpy-{CORPUS_COLLECTION}" if self.corpus_dir else "numpy"),
+                quantize=self.quantize_vectors,
+            )
+        if not self.corpus_dir:
+            return Chroma(
+                embedding_function=self.embeddings_model,
+                persist_directory=self.persist_directory,
+            )
+        # The ingest CLI writes this store from another process, and Chroma shares one client
+        # System per directory within a process, which keeps serving the vectors it loaded
+        # first. The only public way out, SharedSystemClient.clear_system_cache(), stops every
+        # System, including the one an old engine is still answering from, so this engine's
+        # cache entry is dropped from the private registry instead; close() stops the old System.
+        from chromadb.api.shared_system_client import SharedSystemClient
+        SharedSystemClient._identifier_to_system.pop(self.persist_directory, None)
+        vectorstore = Chroma(
+            collection_name=CORPUS_COLLECTION,
+            embedding_function=self.embeddings_model,
+            persist_directory=self.persist_directory,
+        )
+        # Kept here because the client looks its System up by directory, i.e. the newest one
+        self._chroma_system = SharedSystemClient._identifier_to_system.get(self.persist_directory)
+        return vectorstore
+
+    def _open_ingested_corpus(self):
+        from .ingest import INGEST_MANIFEST
+
+        manifest = load_index_manifest(self.persist_directory, INGEST_MANIFEST)
+        if (manifest is None or manifest.get("embedding_model") != self.embedding_model_name
+                or manifest.get("collection") != CORPUS_COLLECTION
+                or manifest.get("vector_store") != type(self.vectorstore).__name__):
+            # Indexing a whole corpus here would hold up the first chat request (and every
+            # session waiting for the engine), so it is only ever done by the CLI
+            raise RuntimeError(
+                f"No {self.vector_store_type} index of CORPUS_DIR for {self.embedding_model_name} in "
+                f"{self.persist_directory}; run `python -m backends.ingest {self.corpus_dir} "
+                f"--persist-directory {self.persist_directory} --vector-store {self.vector_store_type}` first"
+            )
+        self.corpus_version = manifest["corpus_version"]
+        self._manifest_mtime = self.manifest_mtime()
+
+    def manifest_mtime(self):
+        from .ingest import INGEST_MANIFEST
+
+        try:
+            return os.stat(os.path.join(self.persist_directory, INGEST_MANIFEST)).st_mtime_ns
+        except OSError:
+            return None
+
+    def index_changed(self) -> bool:
+        """True once `python -m backends.ingest` has finished a run that changed the corpus
+        since this engine opened it; a stat of the manifest while nothing changes"""
+        if not self.corpus_dir:
+            return False
+        from .ingest import INGEST_MANIFEST
+
+        mtime = self.manifest_mtime()
+        if mtime is None or mtime == self._manifest_mtime:
+            return False
+        self._manifest_mtime = mtime
+        manifest = load_index_manifest(self.persist_directory, INGEST_MANIFEST)
+        return manifest is not None and manifest.get("corpus_version") != self.corpus_version
+
+    def get_chunks(self):
+        """Document chunks, parsed on first use (the index may be reused without them)"""
         if self.chunks is None:
             self.chunks = load_and_process_document(self.file_path)
-        
-        if self.vectorstore is None:
-            # Simple approach with persistent directory
-            self.vectorstore = Chroma.from_documents(
-                documents=self.chunks,
-                embedding=self.embeddings_model,
-                persist_directory="./chroma_db"
-            )
+        return self.chunks
             
     def create_vectorstore(self):
         # Just return the already initialized vectorstore
         return self.vectorstore
     
-    def setup_qa_chain(self, vectorstore):
-        retriever = vectorstore.as_retriever()
+    def search_kwargs(self) -> Dict[str, Any]:
+        """Retriever arguments for the configured search mode"""
+        search_kwargs = {"k": self.k}
+        if self.search_type == "mmr":
+            search_kwargs["fetch_k"] = max(self.fetch_k, self.k)
+            search_kwargs["lambda_mult"] = self.lambda_mult
+        elif self.search_type == "similarity_score_threshold":
+            search_kwargs["score_threshold"] = self.score_threshold
+        return search_kwargs
+
+    def get_lexical_index(self) -> BM25Index:
+        """BM25 index over exactly the chunks held by the vector store"""
+        if self._lexical_index is None:
+            stored = self.vectorstore.get(include=["documents", "metadatas"])
+            documents = [
+                Document(page_content=content, metadata=metadata or {}, id=chunk_id)
+                for chunk_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            ]
+            self._lexical_index = BM25Index(documents)
+        return self._lexical_index
+
+    def get_retriever(self, vectorstore=None):
+        vectorstore = vectorstore or self.vectorstore
+        vector_retriever = vectorstore.as_retriever(search_type=self.search_type, search_kwargs=self.search_kwargs())
+        if self.retrieval_mode == "vector":
+            return vector_retriever
+        return HybridRetriever(
+            lexical_index=self.get_lexical_index(),
+            vector_retriever=vector_retriever if self.retrieval_mode == "hybrid" else None,
+            k=self.k,
+            vector_timeout=self.vector_timeout,
+        )
+
+    def get_qa_chain(self, llm=None):
+        """Return the compiled QA chain for llm (default self.llm), rebuilding it only when its configuration changes"""
+        llm = llm or self.llm
+        config = (id(self.vectorstore), self.retrieval_mode, self.search_type,
+                  tuple(sorted(self.search_kwargs().items())))
+        cached = self._qa_chains.get(id(llm))
+        if cached is None or cached[0] != config:
+            cached = self._qa_chains[id(llm)] = (config, self.setup_qa_chain(self.vectorstore, llm))
+        return cached[1]
 
-        template = self.prompt_template
-        prompt = ChatPromptTemplate.from_template(template)
+    def setup_qa_chain(self, vectorstore, llm=None):
+        retriever = self.get_retriever(vectorstore)
 
-        model = self.llm
+        prompt = self.prompt if not telemetry.enabled else RunnableLambda(self.format_prompt)
 
-        input_processor = InputProcessor(retriever)
+        model = llm or self.llm
+
+        input_processor = InputProcessor(retriever, self.context_packer)
         return (
             RunnablePassthrough() |
             input_processor |
@@ -111,29 +455,284 @@ class ChatAI():
             model
         )
 
+    def create_router(self) -> ModelRouter:
+        backend = os.getenv('ROUTER_SMALL_BACKEND') or os.getenv('LLM_BACKEND', 'groq')
+        small = create_llm(backend, os.getenv('ROUTER_SMALL_MODEL') or SMALL_MODELS.get(backend))
+        return ModelRouter(small, (self.llm, self.model_name), lexical_index=self.get_lexical_index)
+
+    def memory_model(self, custom_llm=False):
+        """(chat model, name) for follow-up rewrites and summaries: the router's small model,
+        else MEMORY_MODEL or the backend's entry in SMALL_MODELS, else the answering model"""
+        if self.router is not None:
+            return self.router.model(SMALL), self.router.model_name(SMALL)
+        backend = os.getenv('LLM_BACKEND', 'groq')
+        model = os.getenv('MEMORY_MODEL') or (None if custom_llm else SMALL_MODELS.get(backend))
+        if model is None:
+            return self.llm, self.model_name
+        return create_llm(backend, model)
+
+    def select_model(self, query, history=""):
+        """Return (route, chat model, model name) for a question; route is None without a router"""
+        if self.router is None:
+            return None, self.llm, self.model_name
+        route = self.router.route(query, history)
+        return route, self.router.model(route), self.router.model_name(route)
+
+    def record_route(self, route, started, ttft, answer, usage):
+        if route is None:
+            return
+        usage = usage or {}
+        self.router.record(route, time.perf_counter() - started, ttft, usage.get("input_tokens", 0),
+                           usage.get("output_tokens") or count_tokens(answer))
+
+    def get_scope_gate(self):
+        config = (id(self.vectorstore), id(self.get_lexical_index()))
+        if self._scope_gate is None or self._scope_gate_config != config:
+            self._scope_gate = ScopeGate(
+                self.vectorstore,
+                self.get_lexical_index(),
+                coverage_in=float(os.getenv('SCOPE_GATE_COVERAGE_IN', '0.6')),
+                coverage_out=float(os.getenv('SCOPE_GATE_COVERAGE_OUT', '0.25')),
+                relevance_in=float(os.getenv('SCOPE_GATE_RELEVANCE_IN', '0.45')),
+                relevance_out=float(os.getenv('SCOPE_GATE_RELEVANCE_OUT', '0.25')),
+                relevance_kb=float(os.getenv('SCOPE_GATE_RELEVANCE_KB', '0.2')),
+            )
+            self._scope_gate_config = config
+        return self._scope_gate
+
+    def canned_answer(self, query) -> Union[str, None]:
+        """The prompt's fixed reply when the scope gate is confident the LLM would give it"""
+        if not self.scope_gate_enabled:
+            return None
+        with telemetry.timed("scope_gate") as stage:
+            try:
+                answer = self.get_scope_gate().canned_response(query)
+            except Exception as e:
+                print(f"Scope gate skipped: {e}")
+                answer = None
+            stage.set("canned", "true" if answer else "false")
+        return answer
+
+    def format_prompt(self, inputs):
+        """Prompt step of the chain when telemetry is on"""
+        with telemetry.timed("prompt_format"):
+            return self.prompt.invoke(inputs)
+
+    def response_cache_key(self, query, model_name=None) -> str:
+        return response_cache_key(query, self.prompt_template, model_name or self.model_name, self.k,
+                                  self.corpus_version)
+
+    def lookup_cached_answer(self, query, model_name=None) -> Union[str, None]:
+        """Exact match in the shared SQLite cache first, then the in-process semantic cache.
+        model_name is the model the question is routed to; answers of other models don't count."""
+        model_name = model_name or self.model_name
+        with telemetry.timed("cache_lookup", model=model_name) as stage:
+            cached = get_cached_response(self.response_cache_key(query, model_name))
+            if cached is None:
+                try:
+                    cached = self.semantic_cache.lookup(query, self.corpus_version, model_name)
+                except Exception as e:
+                    # The embedding provider is down; the exact-match cache still works
+                    print(f"Semantic cache lookup failed: {e}")
+                stage.set("cache", "miss" if cached is None else "semantic_hit")
+            else:
+                stage.set("cache", "exact_hit")
+        return cached
+
+    def remember_answer(self, query, answer, model_name=None):
+        if not answer:
+            return
+        model_name = model_name or self.model_name
+        save_cached_response(self.response_cache_key(query, model_name), query, answer, model_name,
+                             self.corpus_version)
+        try:
+            self.semantic_cache.store(query, answer, self.corpus_version, model_name)
+        except Exception as e:
+            print(f"Semantic cache store failed: {e}")
+
+    def degraded_answer(self, query, partial="") -> str:
+        """Reply when generation fails: a note after a partial answer, otherwise the best BM25 passage"""
+        if partial:
+            return INTERRUPTED_NOTE
+        best = self.get_lexical_index().search(query, 1)
+        if not best:
+            return UNAVAILABLE_RESPONSE
+        passage = best[0][0].page_content.strip()
+        if len(passage) > 600:
+            passage = passage[:600].rsplit(" ", 1)[0] + " ..."
+        return DEGRADED_RESPONSE.format(passage=passage)
+
     def ask_question(self, query, stream=False):
-        qa_chain = self.setup_qa_chain(self.vectorstore)
+        route, llm, model_name = self.select_model(query)
+        if not stream:
+            cached = self.lookup_cached_answer(query, model_name) or self.canned_answer(query)
+            if cached is not None:
+                return cached
+
+        qa_chain = self.get_qa_chain(llm)
 
         if stream:
             return self._astream_response(qa_chain, query)
         else:
-            return self._get_full_response(qa_chain, query)
+            started = time.perf_counter()
+            response = self._get_full_response(qa_chain, query, model_name=model_name)
+            self.record_route(route, started, None, response, None)
+            return response
+
+    def stream_answer(self, query, username=None, messages=None, cancelled=None) -> Generator[str, None, None]:
+        """Stream an answer, replaying a cached one for repeated or paraphrased questions.
+
+        With a username and the earlier messages, follow-ups are answered in the
+        context of the conversation (see backends/memory.py). `cancelled` is polled
+        while waiting for tokens; once it returns True the stream raises
+        coalesce.Cancelled and, if no one else is waiting for the same answer,
+        the generation is aborted.
+        """
+        history, query = self.prepare_question(query, username, messages)
+        selection = self.select_model(query, history)
+        cached = self.lookup_cached_answer(query, selection[2]) or self.canned_answer(query)
+        if cached is not None:
+            yield from replay_answer(cached)
+            return
+        yield from self.single_flight.stream(self.flight_key(query, history),
+                                             lambda: self._generate_answer(query, history, selection), cancelled)
+
+    async def astream_answer(self, query, username=None, messages=None) -> AsyncIterator[str]:
+        """Async counterpart of stream_answer; blocking cache I/O runs in a worker thread"""
+        history, query = await asyncio.to_thread(self.prepare_question, query, username, messages)
+        selection = await asyncio.to_thread(self.select_model, query, history)
+        cached = await asyncio.to_thread(
+            lambda: self.lookup_cached_answer(query, selection[2]) or self.canned_answer(query))
+        if cached is not None:
+            for piece in replay_answer(cached):
+                yield piece
+            return
+        async for chunk in self.single_flight.astream(self.flight_key(query, history),
+                                                      lambda: self._generate_answer(query, history, selection)):
+            yield chunk
+
+    def prepare_question(self, query, username=None, messages=None):
+        """Return (conversation history, standalone question); caches and retrieval use the latter"""
+        if not username or not messages:
+            return "", query
+        return self.memory.prepare(username, messages, query)
 
-    def _stream_response(self, chain, query) -> Generator[str, None, None]:
+    def flight_key(self, query, history=""):
+        """Identical questions share a generation; one answered with a conversation only
+        with the same question in the same conversation"""
+        key = (normalize_question(query), self.corpus_version)
+        return key + (hashlib.sha256(history.encode('utf-8')).hexdigest(),) if history else key
+
+    async def _generate_answer(self, query, history="", selection=None) -> AsyncIterator[str]:
+        """The one upstream generation behind a flight; caches the answer when it completes,
+        unless it was written with the user's conversation in the prompt. selection is
+        select_model's (route, model, model name) when the caller already routed the question."""
+        route, llm, model_name = selection or self.select_model(query, history)
+        answer = ""
+        usage = None
+        ttft = None
+        fallback = None
+        started = time.perf_counter()
+        with telemetry.timed_stream("generation", model=model_name, route=route, cache="miss") as stage:
+            try:
+                async for chunk in resilient_astream(
+                    lambda: self._astream_response(self.get_qa_chain(llm), query, history),
+                    get_breaker(f"llm:{model_name}"),
+                ):
+                    if chunk.content and ttft is None:
+                        ttft = time.perf_counter() - started
+                        stage.first_token()
+                    if chunk.usage_metadata:
+                        usage = chunk.usage_metadata
+                    answer += chunk.content
+                    yield chunk.content
+            except Exception as e:
+                print(f"Generation failed: {e}")
+                stage.set("outcome", "interrupted" if answer else "degraded")
+                fallback = self.degraded_answer(query, partial=answer)
+            stage.set("answer_chars", len(answer))
+        if fallback is not None:
+            yield fallback
+            return
+        self.record_route(route, started, ttft, answer, usage)
+        if not history:
+            await asyncio.to_thread(self.remember_answer, query, answer, model_name)
+
+    def _stream_response(self, chain, query, history="") -> Generator[str, None, None]:
         answer = ""
-        for chunk in chain.stream({"question": query}):
-            yield chunk.content
-            answer += chunk.content
+        with telemetry.timed_stream("generation", model=self.model_name, cache="miss") as stage:
+            for chunk in chain.stream({"question": query, "history": history}):
+                if chunk.content:
+                    stage.first_token()
+                yield chunk.content
+                answer += chunk.content
         # self.save_message(query, answer)
 
-    def _astream_response(self, chain, query) -> AsyncIterator[str]:
-        return chain.astream({"question": query})
+    def _astream_response(self, chain, query, history="") -> AsyncIterator[str]:
+        return chain.astream({"question": query, "history": history})
 
-    def _get_full_response(self, chain, query: str) -> str:
-        response = chain.invoke({"question": query})
+    def _get_full_response(self, chain, query: str, history="", model_name=None) -> str:
+        model_name = model_name or self.model_name
+        with telemetry.timed("generation", model=model_name, cache="miss", stream="false") as stage:
+            try:
+                response = call_with_retries(lambda: chain.invoke({"question": query, "history": history}),
+                                             get_breaker(f"llm:{model_name}"), LLM_TIMEOUT)
+            except Exception as e:
+                print(f"Generation failed: {e}")
+                stage.set("outcome", "degraded")
+                return self.degraded_answer(query)
+        self.remember_answer(query, response.content, model_name)
         return response.content
 
 
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> ChatAI:
+    """Return the process-wide ChatAI, building it on first use and rebuilding it
+    after the ingest CLI has changed the corpus."""
+    global _engine
+    engine = _engine
+    if engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ChatAI()
+            engine = _engine
+    elif engine.index_changed():
+        print("Corpus re-indexed, reloading the engine")
+        try:
+            engine = reload_engine()
+        except Exception as e:
+            # Keep answering from the index already open
+            print(f"Engine reload failed: {e}")
+    return engine
+
+def warm_engine() -> ChatAI:
+    """Build the shared engine ahead of the first question."""
+    return get_engine()
+
+def reload_engine() -> ChatAI:
+    """Build a fresh engine (e.g. after the document changed) and swap it in.
+
+    Sessions holding the old engine finish their current answer with it; its
+    threads are released once those answers are done.
+    """
+    global _engine
+    engine = ChatAI()
+    with _engine_lock:
+        old, _engine = _engine, engine
+    if old is not None:
+        old.close()
+    return engine
+
+def shutdown_engine():
+    """Drop the shared engine and release its threads."""
+    global _engine
+    with _engine_lock:
+        old, _engine = _engine, None
+    if old is not None:
+        old.close()
+
 
 # while True:
 #     question = input("Enter a question: ")
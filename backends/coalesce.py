@@ -0,0 +1,200 @@
+"""Single-flight coalescing of identical in-flight questions.
+
+The first request for a key starts one generation on a background event
+loop; every concurrent request for the same key attaches to it and receives
+the full token stream, from the first token even if it joins midway. Once
+the generation finishes the key is released, so later askers go through
+the answer caches instead. When the last subscriber leaves early (the user
+moved on, the client disconnected) the generation is cancelled and the
+upstream stream closed.
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Generator, Hashable, List, Optional
+
+
+class Cancelled(Exception):
+    """Raised in a subscriber whose caller no longer wants the answer."""
+
+
+class Flight:
+    """One shared generation: the tokens produced so far plus its outcome."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.future = None
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    def _notify(self):
+        self._condition.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def publish(self, chunk: str):
+        with self._condition:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, error: BaseException = None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def subscribe(self, cancelled: Optional[Callable[[], bool]] = None,
+                  poll: float = 0.2) -> Generator[str, None, None]:
+        """Yield the chunks; with `cancelled`, it is checked every `poll` seconds and
+        between chunks, and Cancelled is raised once it returns True."""
+        index = 0
+        while True:
+            with self._condition:
+                if index >= len(self.chunks) and not self.done:
+                    self._condition.wait(poll if cancelled is not None else None)
+                pending = self.chunks[index:]
+                done, error = self.done, self.error
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+            index += len(pending)
+            yield from pending
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def asubscribe(self) -> AsyncIterator[str]:
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._condition:
+            self._async_waiters.append(waiter)
+        try:
+            index = 0
+            while True:
+                with self._condition:
+                    pending = self.chunks[index:]
+                    done, error = self.done, self.error
+                    event.clear()
+                index += len(pending)
+                for chunk in pending:
+                    yield chunk
+                if done and index >= len(self.chunks):
+                    if error is not None:
+                        raise error
+                    return
+                if not pending:
+                    await event.wait()
+        finally:
+            with self._condition:
+                self._async_waiters.remove(waiter)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._running = 0
+        self._closing = False
+        self._on_closed = None
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """The loop generations run on, started on first use; call with the lock held"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._run, args=(self._loop,), name="single-flight", daemon=True).start()
+        return self._loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop):
+        loop.run_forever()
+        loop.close()
+
+    def _stop_if_idle(self):
+        """Stop the loop after close() once no generation is running; call with the lock held"""
+        if self._closing and not self._running and self._loop is not None:
+            if self._on_closed is not None:
+                self._loop.call_soon_threadsafe(self._on_closed)
+                self._on_closed = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def close(self, on_closed: Optional[Callable[[], None]] = None):
+        """Stop the background loop once the generations still running have finished,
+        then call on_closed (right away if nothing is running)."""
+        with self._lock:
+            self._closing = True
+            if self._running or self._loop is not None:
+                self._on_closed = on_closed
+                self._stop_if_idle()
+                return
+        if on_closed is not None:
+            on_closed()
+
+    async def _produce(self, key: Hashable, flight: Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in factory():
+                flight.publish(chunk)
+        except BaseException as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                self._running -= 1
+                self._stop_if_idle()
+
+    def join(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> Flight:
+        """Attach to the generation running for key, starting it with factory() if there is none."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self.started += 1
+                self._running += 1
+                flight.future = asyncio.run_coroutine_threadsafe(self._produce(key, flight, factory),
+                                                                 self._background_loop())
+            else:
+                self.joined += 1
+            flight.subscribers += 1
+        return flight
+
+    def leave(self, key: Hashable, flight: Flight):
+        """Detach a subscriber; cancel the generation if nobody is left waiting for it."""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+            # Later askers start a fresh generation instead of joining the cancelled one
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self.cancelled += 1
+        flight.future.cancel()
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]],
+               cancelled: Optional[Callable[[], bool]] = None) -> Generator[str, None, None]:
+        flight = self.join(key, factory)
+        try:
+            yield from flight.subscribe(cancelled)
+        finally:
+            self.leave(key, flight)
+
+    async def astream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self.join(key, factory)
+        try:
+            async for chunk in flight.asubscribe():
+                yield chunk
+        finally:
+            self.leave(key, flight)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"inflight": len(self._flights), "started": self.started, "joined": self.joined,
+                    "cancelled": self.cancelled}
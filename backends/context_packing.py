@@ -0,0 +1,151 @@
+"""Assemble retrieved chunks into a compact, token-budgeted prompt context.
+
+Chunks are split with an overlap (CHUNK_OVERLAP), so neighbouring hits
+repeat text. The packer stitches chunks whose edges overlap back into one
+contiguous span, drops spans that are (nearly) contained in a better one,
+keeps the spans in retrieval order (best first) and stops adding text once
+the token budget is reached.
+"""
+import re
+import threading
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+from .memory import count_tokens
+
+
+class Span:
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content.strip()
+        self.source = (doc.metadata or {}).get("source")
+        self.rank = rank
+
+
+class PackedContext:
+    def __init__(self, text: str, tokens: int, raw_tokens: int, chunks: int, spans: int):
+        self.text = text
+        self.tokens = tokens
+        self.raw_tokens = raw_tokens
+        self.chunks = chunks
+        self.spans = spans
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+def edge_overlap(left: str, right: str, min_overlap: int, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right (0 if under min_overlap)."""
+    if len(right) < min_overlap:
+        return 0
+    tail = left[-min(max_overlap, len(right)):]
+    seed = right[:min_overlap]
+    start = tail.find(seed)
+    while start != -1:
+        if right.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(seed, start + 1)
+    return 0
+
+
+def word_set(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class ContextPacker:
+    def __init__(self, token_budget: int = 1500, min_overlap: int = 20, max_overlap: int = 200,
+                 duplicate_threshold: float = 0.9, separator: str = "\n\n"):
+        self.token_budget = token_budget
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.duplicate_threshold = duplicate_threshold
+        self.separator = separator
+        self._lock = threading.Lock()
+        self.packed = 0
+        self.raw_tokens = 0
+        self.tokens = 0
+
+    def merge(self, docs: List[Document]) -> List[Span]:
+        """Stitch chunks that overlap at their edges into contiguous spans, best rank first"""
+        spans: List[Span] = []
+        for rank, doc in enumerate(docs):
+            pending = Span(doc, rank)
+            merged = True
+            while merged:
+                merged = False
+                for span in spans:
+                    if span.source != pending.source:
+                        continue
+                    if pending.text in span.text:
+                        pass
+                    elif span.text in pending.text:
+                        span.text = pending.text
+                    else:
+                        size = edge_overlap(span.text, pending.text, self.min_overlap, self.max_overlap)
+                        if size:
+                            span.text += pending.text[size:]
+                        else:
+                            size = edge_overlap(pending.text, span.text, self.min_overlap, self.max_overlap)
+                            if not size:
+                                continue
+                            span.text = pending.text + span.text[size:]
+                    span.rank = min(span.rank, pending.rank)
+                    # The grown span may now join another one
+                    spans.remove(span)
+                    pending, merged = span, True
+                    break
+            spans.append(pending)
+            spans.sort(key=lambda span: span.rank)
+        return spans
+
+    def drop_near_duplicates(self, spans: List[Span]) -> List[Span]:
+        """Drop spans whose words are mostly covered by a better-ranked span"""
+        kept: List[Span] = []
+        kept_words: List[set] = []
+        for span in spans:
+            words = word_set(span.text)
+            if words and any(len(words & other) / len(words) >= self.duplicate_threshold for other in kept_words):
+                continue
+            kept.append(span)
+            kept_words.append(words)
+        return kept
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Cut text to roughly `budget` tokens, preferring a sentence boundary"""
+        pieces = re.findall(r"\S+\s*", text)
+        cut, used = [], 0
+        for piece in pieces:
+            used += count_tokens(piece)
+            if used > budget:
+                break
+            cut.append(piece)
+        cut = "".join(cut).rstrip()
+        sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+        return cut[:sentence_end + 1].rstrip() if sentence_end > len(cut) // 2 else cut
+
+    def pack(self, docs: List[Document]) -> PackedContext:
+        raw_tokens = sum(count_tokens(doc.page_content) for doc in docs)
+        spans = self.drop_near_duplicates(self.merge(docs))
+        parts, used = [], 0
+        for span in spans:
+            tokens = count_tokens(span.text)
+            if used + tokens > self.token_budget:
+                text = self.truncate(span.text, self.token_budget - used)
+                if text:
+                    parts.append(text)
+                    used += count_tokens(text)
+                break
+            parts.append(span.text)
+            used += tokens
+        packed = PackedContext(self.separator.join(parts), used, raw_tokens, len(docs), len(parts))
+        with self._lock:
+            self.packed += 1
+            self.raw_tokens += raw_tokens
+            self.tokens += used
+        return packed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"packed": self.packed, "raw_tokens": self.raw_tokens, "tokens": self.tokens,
+                    "tokens_saved": self.raw_tokens - self.tokens}
@@ -0,0 +1,243 @@
+"""Incremental ingestion of a directory of documents into the vector store.
+
+    python -m backends.ingest path/to/corpus [--persist-directory ./chroma_db]
+
+Files are parsed and chunked in a process pool, chunks are embedded in
+provider-sized batches with bounded concurrency, and only chunks whose
+content hash is not already stored get embedded. Unchanged files are
+skipped without being parsed; chunks of edited or deleted files are removed.
+Point the app at the result with CORPUS_DIR; the app never indexes the
+corpus itself and refuses to start without a matching run, and a running
+app picks up a finished run on its next question. The corpus is
+kept in its own collection, apart from the data.docx index ChatAI builds
+when CORPUS_DIR is not set.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from typing import Dict, List, Any
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .ai_backend import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CORPUS_COLLECTION,
+    chunk_digest,
+    corpus_digest,
+    file_digest,
+    load_index_manifest,
+    save_index_manifest,
+)
+
+INGEST_MANIFEST = "ingest_manifest.json"
+SUPPORTED_EXTENSIONS = {".docx", ".pdf", ".md", ".markdown", ".html", ".htm", ".txt"}
+EMBED_BATCH_SIZE = 96  # Cohere embed accepts at most 96 texts per call
+EMBED_CONCURRENCY = 4
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+def load_file(path: str) -> List[Document]:
+    """Read one corpus file into langchain documents."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".docx":
+        from langchain_community.document_loaders import Docx2txtLoader
+        return Docx2txtLoader(path).load()
+    if extension == ".pdf":
+        try:
+            from langchain_community.document_loaders import PyPDFLoader
+            return PyPDFLoader(path).load()
+        except ImportError:
+            raise ImportError("PDF ingestion needs the pypdf package: pip install pypdf")
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if extension in (".html", ".htm"):
+        extractor = _TextExtractor()
+        extractor.feed(text)
+        text = "\n".join(extractor.parts)
+    return [Document(page_content=text, metadata={"source": path})]
+
+
+def parse_and_chunk(path: str, relative_path: str) -> List[Document]:
+    """Worker entry point: load a file and split it into chunks."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents(load_file(path))
+    for chunk in chunks:
+        chunk.metadata["source"] = relative_path
+    return chunks
+
+
+def find_corpus_files(corpus_dir: str) -> Dict[str, str]:
+    """Map each supported file's path relative to corpus_dir to its absolute path."""
+    files = {}
+    for root, _, names in os.walk(corpus_dir):
+        for name in sorted(names):
+            if name.startswith((".", "~$")) or os.path.splitext(name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, corpus_dir)] = path
+    return files
+
+
+class Progress:
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+        self.start = time.perf_counter()
+
+    def report(self, message: str):
+        if not self.quiet:
+            print(f"[{time.perf_counter() - self.start:7.2f}s] {message}", flush=True)
+
+
+def ingest_corpus(corpus_dir: str, vectorstore, embeddings, embedding_model_name: str, persist_directory: str,
+                  workers: int = None, batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                  quiet: bool = False) -> Dict[str, Any]:
+    """Bring the vector store in line with the files under corpus_dir."""
+    progress = Progress(quiet)
+    signature = {
+        "vector_store": type(vectorstore).__name__,
+        "collection": CORPUS_COLLECTION,
+        "embedding_model": embedding_model_name,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+    manifest = load_index_manifest(persist_directory, INGEST_MANIFEST) or {}
+    if any(manifest.get(key) != value for key, value in signature.items()):
+        if manifest:
+            vectorstore.reset_collection()
+        manifest = {}
+    previous_files = manifest.get("files", {})
+
+    corpus_files = find_corpus_files(corpus_dir)
+    hashes = {relative_path: file_digest(path) for relative_path, path in corpus_files.items()}
+    changed = [relative_path for relative_path in corpus_files
+               if previous_files.get(relative_path, {}).get("hash") != hashes[relative_path]]
+    removed = [relative_path for relative_path in previous_files if relative_path not in corpus_files]
+    progress.report(f"{len(corpus_files)} files, {len(changed)} new or changed, {len(removed)} removed")
+
+    files = {relative_path: entry for relative_path, entry in previous_files.items()
+             if relative_path in corpus_files and relative_path not in changed}
+    stored = set(vectorstore.get(include=[])["ids"])
+    pending: Dict[str, Document] = {}
+    embedded = 0
+    embed_start = time.perf_counter()
+
+    def embed_and_upsert(batch_ids: List[str]) -> int:
+        documents = [pending[chunk_id] for chunk_id in batch_ids]
+        vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+        upsert = getattr(vectorstore, "upsert_embeddings", None) or vectorstore._collection.upsert
+        upsert(
+            ids=batch_ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+        )
+        return len(batch_ids)
+
+    # Batches are embedded as soon as enough new chunks have been parsed, so parsing
+    # and embedding overlap instead of the embedder waiting for the slowest file
+    batches = []
+    batch: List[str] = []
+    with ThreadPoolExecutor(max_workers=concurrency) as embed_pool:
+        if changed:
+            with ProcessPoolExecutor(max_workers=workers) as parse_pool:
+                futures = {parse_pool.submit(parse_and_chunk, corpus_files[relative_path], relative_path): relative_path
+                           for relative_path in changed}
+                for number, future in enumerate(as_completed(futures), 1):
+                    relative_path = futures[future]
+                    chunk_ids = []
+                    for chunk in future.result():
+                        chunk_id = chunk_digest(chunk)
+                        chunk_ids.append(chunk_id)
+                        if chunk_id not in stored and chunk_id not in pending:
+                            pending[chunk_id] = chunk
+                            batch.append(chunk_id)
+                    files[relative_path] = {"hash": hashes[relative_path], "chunk_ids": sorted(set(chunk_ids))}
+                    progress.report(f"parsed {number}/{len(changed)} {relative_path} ({len(chunk_ids)} chunks)")
+                    while len(batch) >= batch_size:
+                        batches.append(embed_pool.submit(embed_and_upsert, batch[:batch_size]))
+                        batch = batch[batch_size:]
+        if batch:
+            batches.append(embed_pool.submit(embed_and_upsert, batch))
+        for future in as_completed(batches):
+            embedded += future.result()
+            rate = embedded / max(time.perf_counter() - embed_start, 1e-9)
+            progress.report(f"embedded {embedded}/{len(pending)} chunks ({rate:.1f} chunks/s)")
+
+    wanted = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+    stale_ids = sorted(stored - wanted)
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        progress.report(f"removed {len(stale_ids)} stale chunks")
+
+    corpus_version = corpus_digest(sorted(wanted))
+    save_index_manifest(persist_directory, dict(signature, files=files, corpus_version=corpus_version), INGEST_MANIFEST)
+    summary = {
+        "files": len(corpus_files),
+        "changed_files": len(changed),
+        "removed_files": len(removed),
+        "chunks": len(wanted),
+        "embedded": embedded,
+        "deleted": len(stale_ids),
+        "corpus_version": corpus_version,
+        "seconds": time.perf_counter() - progress.start,
+    }
+    progress.report(f"done: {summary}")
+    return summary
+
+
+def main(argv=None):
+    from langchain_chroma import Chroma
+    from .numpy_store import NumpyVectorStore
+    from .registry import create_embeddings
+    from .resilience import ResilientEmbeddings
+
+    parser = argparse.ArgumentParser(description="Index a directory of documents for the chat assistant.")
+    parser.add_argument("corpus_dir")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--embeddings-backend", default=None, help="defaults to EMBEDDINGS_BACKEND or cohere")
+    parser.add_argument("--embedding-model", default=None)
+    parser.add_argument("--vector-store", choices=["chroma", "numpy"], default=os.getenv('VECTOR_STORE', 'chroma'))
+    parser.add_argument("--quantize", action="store_true", help="store int8 vectors (numpy store only)")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="embedding requests in flight")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    embeddings, embedding_model = create_embeddings(args.embeddings_backend, args.embedding_model)
+    embeddings = ResilientEmbeddings(embeddings, embedding_model)
+    if args.vector_store == "numpy":
+        vectorstore = NumpyVectorStore(embeddings, os.path.join(args.persist_directory, f"numpy-{CORPUS_COLLECTION}"),
+                                       quantize=args.quantize)
+    else:
+        vectorstore = Chroma(collection_name=CORPUS_COLLECTION, embedding_function=embeddings,
+                             persist_directory=args.persist_directory)
+    ingest_corpus(args.corpus_dir, vectorstore, embeddings, embedding_model, args.persist_directory,
+                  workers=args.workers, batch_size=args.batch_size, concurrency=args.concurrency, quiet=args.quiet)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Keyword side of hybrid retrieval: the tokenizer and an in-memory BM25 index.
+
+Kept free of the rest of the backend so the scope gate, which reads the same
+vocabulary, can import it alongside ai_backend.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; keeps course codes like csc101 and room numbers intact"""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class BM25Index:
+    """In-memory BM25 inverted index over document chunks"""
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[tuple]] = {}
+        self.doc_lengths = []
+        for doc_index, doc in enumerate(documents):
+            terms = Counter(tokenize(doc.page_content))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, []).append((doc_index, frequency))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 5) -> List[tuple]:
+        """Return up to k (document, score) pairs, best first"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[doc_index], score) for doc_index, score in best]
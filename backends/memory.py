@@ -0,0 +1,163 @@
+"""Token-budgeted conversation memory for follow-up questions.
+
+The prompt gets a rolling summary of older turns (kept per user in the
+conversation_summaries table) plus the last few turns verbatim, trimmed to a
+token budget. Only follow-ups in a conversation the student has actually
+had (a greeting doesn't count) use it: "and what about HND?" is rewritten
+into a standalone question, by a small model, before retrieval and the cache
+lookup. Self-contained questions skip the rewrite and are answered without
+the history, so their answers can be cached and shared. Older turns are
+folded into the summary in the background after an answer, never on the
+request path.
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .resilience import call_with_retries
+from utils.db_utils import flush_messages, get_conversation_summary, get_user_messages_since, save_conversation_summary
+
+# A leading connective, a pronoun standing for something said before, or a
+# question ending on "that" / "this" / "there" ("who teaches that?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|also|but|so|then|what about|how about|what of|same for)\b"
+    r"|\b(it|its|they|them|their|those|these|he|she|him|his|her|the same|the above|the previous|the former|"
+    r"the latter|that one|this one)\b"
+    r"|\b(that|this|there)\W*$",
+    re.IGNORECASE,
+)
+# Questions this short ("why?", "HND?") only make sense as follow-ups
+FOLLOW_UP_MAX_TOKENS = 3
+
+CONDENSE_TEMPLATE = """Rewrite the follow-up question as a single standalone question about the Computer Science Department, using the conversation for context. Reply with the question only.
+
+Conversation:
+{history}
+
+Follow-up question: {question}
+
+Standalone question:"""
+
+SUMMARY_TEMPLATE = """Update the running summary of a conversation between a student and the Computer Science Department assistant. Keep facts the student asked about and answers given; stay under {max_words} words. Reply with the summary only.
+
+Current summary:
+{summary}
+
+New lines:
+{lines}
+
+Updated summary:"""
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count: words, numbers and punctuation marks."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def format_turn(message: Dict) -> str:
+    speaker = "Student" if message["role"] == "user" else "Assistant"
+    return f"{speaker}: {message['content']}"
+
+
+class ConversationMemory:
+    def __init__(self, llm, token_budget: int = 600, recent_messages: int = 4, fold_after: int = 6,
+                 summary_words: int = 120, fold_limit: int = 40, breaker=None, rewrite_timeout: float = 10.0):
+        self.llm = llm
+        self.breaker = breaker
+        self.rewrite_timeout = rewrite_timeout
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.fold_after = fold_after
+        self.summary_words = summary_words
+        self.fold_limit = fold_limit
+        self.condense_prompt = ChatPromptTemplate.from_template(CONDENSE_TEMPLATE)
+        self.summary_prompt = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
+        self._folding = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+    def build_history(self, username: str, messages: List[Dict]) -> str:
+        """Summary plus the latest turns, dropping the oldest lines until it fits the budget."""
+        summary, _ = get_conversation_summary(username)
+        recent = [format_turn(message) for message in messages[-self.recent_messages:]]
+        parts = ([f"Summary of earlier conversation: {summary}"] if summary else []) + recent
+        while parts and sum(count_tokens(part) for part in parts) > self.token_budget:
+            parts.pop(0)
+        return "\n".join(parts)
+
+    def is_follow_up(self, question: str) -> bool:
+        return count_tokens(question) <= FOLLOW_UP_MAX_TOKENS or bool(FOLLOW_UP_PATTERN.search(question))
+
+    def standalone_question(self, question: str, history: str) -> str:
+        """Rewrite a follow-up into a self-contained question; other questions pass through."""
+        if not history or not self.is_follow_up(question):
+            return question
+        messages = self.condense_prompt.format_messages(history=history, question=question)
+        try:
+            rewritten = call_with_retries(lambda: self.llm.invoke(messages), self.breaker, self.rewrite_timeout)
+        except Exception as e:
+            # Answer the question as asked rather than hold up the turn
+            print(f"Follow-up rewrite failed: {e}")
+            return question
+        rewritten = rewritten.content.strip().strip('"').splitlines()[0] if rewritten.content.strip() else ""
+        return rewritten or question
+
+    def prepare(self, username: str, messages: List[Dict], question: str) -> Tuple[str, str]:
+        """Return (history for the prompt, standalone question) for a new question.
+
+        `messages` are the turns before the question, oldest first. The history
+        is empty unless the question is a follow-up to something the student
+        asked; assistant messages alone, like the welcome greeting, are not a
+        conversation.
+        """
+        if not any(message["role"] == "user" for message in messages) or not self.is_follow_up(question):
+            return "", question
+        history = self.build_history(username, messages)
+        return history, self.standalone_question(question, history)
+
+    def fold(self, username: str):
+        """Fold turns older than the verbatim window into the stored summary."""
+        flush_messages(username)
+        summary, until_id = get_conversation_summary(username)
+        unsummarized, has_more = get_user_messages_since(username, until_id, limit=self.fold_limit)
+        if not has_more and self.recent_messages:
+            # Leave the turns that are still sent verbatim out of the summary
+            unsummarized = unsummarized[:-self.recent_messages]
+        foldable = unsummarized
+        if len(foldable) < self.fold_after:
+            return
+        lines = "\n".join(format_turn(message) for message in foldable)
+        messages = self.summary_prompt.format_messages(
+            summary=summary or "(none)", lines=lines, max_words=self.summary_words)
+        response = call_with_retries(lambda: self.llm.invoke(messages), self.breaker, self.rewrite_timeout)
+        save_conversation_summary(username, response.content.strip(), foldable[-1]["id"])
+
+    def update_async(self, username: str):
+        """Schedule a fold for the user unless one is already running."""
+        with self._lock:
+            if username in self._folding:
+                return
+            self._folding.add(username)
+
+        def run():
+            try:
+                self.fold(username)
+            except Exception as e:
+                print(f"Conversation summary update failed: {e}")
+            finally:
+                with self._lock:
+                    self._folding.discard(username)
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            # The engine was closed (reloaded) while this session still held it
+            with self._lock:
+                self._folding.discard(username)
+
+    def close(self):
+        """Let scheduled folds finish, then release the worker threads."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,229 @@
+"""Lightweight vector store: one memory-mapped .npy matrix plus a JSON chunk file.
+
+For a few thousand chunks a single matrix-vector product is faster to load
+and to query than Chroma's SQLite/HNSW stack. Vectors are L2-normalised on
+write, so inner product is cosine similarity. With quantize=True they are
+kept as int8 with a float32 scale per row (about 4x smaller on disk).
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+CHUNKS_FILE = "chunks.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _write_npy(path: str, array: np.ndarray):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+class _Snapshot(NamedTuple):
+    """One version of the store's rows; writers publish a new one instead of mutating it."""
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]
+    vectors: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+
+
+_EMPTY = _Snapshot([], [], [], None, None)
+
+
+def _document(snapshot: _Snapshot, row: int) -> Document:
+    return Document(page_content=snapshot.texts[row], metadata=snapshot.metadatas[row], id=snapshot.ids[row])
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, embedding_function: Embeddings, persist_directory: str, quantize: bool = False):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.quantize = quantize
+        # Writers serialize on the lock and swap in a whole snapshot; readers take no lock but
+        # read self._snapshot once, so they never see ids from one write and vectors from another
+        self._lock = threading.Lock()
+        self._snapshot = _EMPTY
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _load(self):
+        chunks_path = os.path.join(self.persist_directory, CHUNKS_FILE)
+        if not os.path.exists(chunks_path):
+            return
+        with open(chunks_path, "r") as f:
+            chunks = json.load(f)
+        self.quantize = chunks.get("quantize", self.quantize)
+        vectors = scales = None
+        if chunks["ids"]:
+            vectors = np.load(os.path.join(self.persist_directory, VECTORS_FILE), mmap_mode="r")
+            if self.quantize:
+                scales = np.load(os.path.join(self.persist_directory, SCALES_FILE))
+        self._snapshot = _Snapshot(chunks["ids"], chunks["texts"], chunks["metadatas"], vectors, scales)
+
+    def _dense(self, snapshot: _Snapshot) -> np.ndarray:
+        """All of a snapshot's vectors as normalised float32 rows."""
+        if snapshot.vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.quantize:
+            return snapshot.vectors.astype(np.float32) * snapshot.scales[:, None]
+        return np.asarray(snapshot.vectors)
+
+    def _save(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray):
+        """Write a new snapshot of the store and swap it in."""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        vectors_path = os.path.join(self.persist_directory, VECTORS_FILE)
+        scales = None
+        if self.quantize:
+            scales = np.abs(vectors).max(axis=1).astype(np.float32) / 127.0 if len(vectors) else np.zeros(0, np.float32)
+            scales[scales == 0] = 1.0
+            stored = np.round(vectors / scales[:, None]).astype(np.int8)
+            _write_npy(os.path.join(self.persist_directory, SCALES_FILE), scales)
+        else:
+            stored = vectors.astype(np.float32)
+        _write_npy(vectors_path, stored)
+        chunks_path = os.path.join(self.persist_directory, CHUNKS_FILE)
+        with open(chunks_path + ".tmp", "w") as f:
+            json.dump({"quantize": self.quantize, "ids": ids, "texts": texts, "metadatas": metadatas}, f)
+        os.replace(chunks_path + ".tmp", chunks_path)
+
+        self._snapshot = _Snapshot(ids, texts, metadatas, np.load(vectors_path, mmap_mode="r") if ids else None,
+                                   scales)
+
+    def upsert_embeddings(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+                          metadatas: Optional[List[dict]] = None):
+        """Insert or replace rows whose vectors were computed by the caller."""
+        metadatas = metadatas or [{} for _ in ids]
+        new_vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            snapshot = self._snapshot
+            replaced = set(ids)
+            keep = [row for row, chunk_id in enumerate(snapshot.ids) if chunk_id not in replaced]
+            old_vectors = self._dense(snapshot)[keep] if keep else np.zeros((0, new_vectors.shape[1]), np.float32)
+            self._save(
+                [snapshot.ids[row] for row in keep] + list(ids),
+                [snapshot.texts[row] for row in keep] + list(documents),
+                [snapshot.metadatas[row] for row in keep] + list(metadatas),
+                np.vstack([old_vectors, new_vectors]),
+            )
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.upsert_embeddings(ids, self.embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            snapshot = self._snapshot
+            removed = set(ids)
+            keep = [row for row, chunk_id in enumerate(snapshot.ids) if chunk_id not in removed]
+            dense = self._dense(snapshot)
+            self._save(
+                [snapshot.ids[row] for row in keep],
+                [snapshot.texts[row] for row in keep],
+                [snapshot.metadatas[row] for row in keep],
+                dense[keep] if keep else np.zeros((0, dense.shape[1] if dense.ndim == 2 else 0), np.float32),
+            )
+        return True
+
+    def reset_collection(self):
+        with self._lock:
+            self._save([], [], [], np.zeros((0, 0), np.float32))
+
+    def get(self, ids: Optional[Sequence[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Chroma-compatible listing of stored chunks."""
+        include = ["documents", "metadatas"] if include is None else include
+        snapshot = self._snapshot
+        rows = range(len(snapshot.ids))
+        if ids is not None:
+            wanted = set(ids)
+            rows = [row for row in rows if snapshot.ids[row] in wanted]
+        result = {"ids": [snapshot.ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [snapshot.texts[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [snapshot.metadatas[row] for row in rows]
+        return result
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        snapshot = self._snapshot
+        return [_document(snapshot, snapshot.ids.index(chunk_id)) for chunk_id in ids if chunk_id in snapshot.ids]
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _top_k(self, snapshot: _Snapshot, query_vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if snapshot.vectors is None:
+            return []
+        scores = snapshot.vectors @ query_vector
+        if self.quantize:
+            scores = scores * snapshot.scales
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        snapshot = self._snapshot
+        return [(_document(snapshot, row), score) for row, score in self._top_k(snapshot, vector, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        vector = self._embed_query(query)
+        snapshot = self._snapshot
+        return [(_document(snapshot, row), score) for row, score in self._top_k(snapshot, vector, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cosine similarity in [-1, 1] mapped onto [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        query_vector = self._embed_query(query)
+        snapshot = self._snapshot
+        candidates = [row for row, _ in self._top_k(snapshot, query_vector, fetch_k)]
+        if not candidates:
+            return []
+        dense = self._dense(snapshot)[candidates]
+        chosen = maximal_marginal_relevance(query_vector, list(dense), lambda_mult=lambda_mult, k=k)
+        return [_document(snapshot, candidates[index]) for index in chosen]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, persist_directory: str = "./numpy_store",
+                   quantize: bool = False, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, persist_directory, quantize=quantize)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
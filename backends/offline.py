@@ -0,0 +1,121 @@
+"""Deterministic local stand-ins for the embedding model and the chat model.
+
+They need no network or API key, so the pipeline's own overhead can be
+measured and profiled reproducibly (CI, load tests, benchmarks).
+"""
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of word unigrams and bigrams, L2-normalised.
+
+    Texts sharing words get similar vectors, which is enough for retrieval
+    and cache behaviour to look realistic.
+    """
+
+    def __init__(self, size: int = 1024, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        words = _words(text)
+        for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Chat model that streams a deterministic answer at a fixed pace.
+
+    The answer quotes the start of the retrieved context from the prompt, so
+    prompt assembly still matters. `first_token_latency` seconds pass before
+    the first token and then `tokens_per_second` tokens are emitted.
+    """
+
+    model: str = "fake-chat"
+    tokens_per_second: float = 50.0
+    first_token_latency: float = 0.2
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _answer_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        match = re.search(r"Retrieved Context:\s*(.*?)\s*Question:", prompt, re.S)
+        source = match.group(1) if match and match.group(1).strip() else prompt
+        words = source.split()[:self.answer_tokens] or ["No", "context."]
+        return ["Based on the department information: "] + [word + " " for word in words]
+
+    def _chunk(self, token: str, index: int, tokens: List[str], messages: List[BaseMessage]) -> AIMessageChunk:
+        """Message chunk for one token; the last one carries token usage, as real providers report it"""
+        if index < len(tokens) - 1:
+            return AIMessageChunk(content=token)
+        input_tokens = sum(len(_words(str(message.content))) for message in messages)
+        return AIMessageChunk(content=token, usage_metadata={"input_tokens": input_tokens,
+                                                            "output_tokens": len(tokens),
+                                                            "total_tokens": input_tokens + len(tokens)})
+
+    def _delays(self, count: int) -> Iterator[float]:
+        yield self.first_token_latency
+        for _ in range(count - 1):
+            yield 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._answer_tokens(messages)
+        time.sleep(sum(self._delays(len(tokens))))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._answer_tokens(messages)
+        for index, (token, delay) in enumerate(zip(tokens, self._delays(len(tokens)))):
+            if delay:
+                time.sleep(delay)
+            chunk = ChatGenerationChunk(message=self._chunk(token, index, tokens, messages))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._answer_tokens(messages)
+        for index, (token, delay) in enumerate(zip(tokens, self._delays(len(tokens)))):
+            if delay:
+                await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(message=self._chunk(token, index, tokens, messages))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,86 @@
+"""Named factories for the chat model and the embedding model.
+
+The backend is picked with LLM_BACKEND / EMBEDDINGS_BACKEND (and the model
+with LLM_MODEL / EMBEDDINGS_MODEL). "groq" and "cohere" are the production
+defaults; "fake" and "hashing" are the offline stand-ins from
+backends/offline.py. Other providers can be added with register_llm /
+register_embeddings.
+"""
+import os
+from typing import Any, Callable, Dict, Tuple
+
+LLM_BACKENDS: Dict[str, Tuple[Callable[[str], Any], str]] = {}
+EMBEDDING_BACKENDS: Dict[str, Tuple[Callable[[str], Any], str]] = {}
+
+
+def register_llm(name: str, default_model: str):
+    def decorator(factory):
+        LLM_BACKENDS[name] = (factory, default_model)
+        return factory
+    return decorator
+
+
+def register_embeddings(name: str, default_model: str):
+    def decorator(factory):
+        EMBEDDING_BACKENDS[name] = (factory, default_model)
+        return factory
+    return decorator
+
+
+def _lookup(backends: Dict[str, Tuple[Callable[[str], Any], str]], kind: str, name: str):
+    try:
+        return backends[name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind} backend {name!r}; choose one of {', '.join(sorted(backends))}")
+
+
+def create_llm(backend: str = None, model: str = None) -> Tuple[Any, str]:
+    """Return (chat model, model name) for the configured backend."""
+    backend = backend or os.getenv('LLM_BACKEND', 'groq')
+    factory, default_model = _lookup(LLM_BACKENDS, "LLM", backend)
+    model = model or os.getenv('LLM_MODEL') or default_model
+    return factory(model), model
+
+
+def create_embeddings(backend: str = None, model: str = None) -> Tuple[Any, str]:
+    """Return (embeddings, model name) for the configured backend."""
+    backend = backend or os.getenv('EMBEDDINGS_BACKEND', 'cohere')
+    factory, default_model = _lookup(EMBEDDING_BACKENDS, "embeddings", backend)
+    model = model or os.getenv('EMBEDDINGS_MODEL') or default_model
+    return factory(model), model
+
+
+@register_llm("groq", "llama3-70b-8192")
+def _groq(model: str):
+    from langchain_groq import ChatGroq
+    # Retries and deadlines are handled by ChatAI (backends/resilience.py); the SDK
+    # timeout only bounds how long an abandoned request holds its worker thread
+    return ChatGroq(groq_api_key=os.getenv('GROQ_API_KEY'), model=model, groq_api_base=os.getenv('GROQ_BASE_URL'),
+                    max_retries=0, request_timeout=float(os.getenv('LLM_TIMEOUT', '60')))
+
+
+@register_llm("fake", "fake-chat")
+def _fake_llm(model: str):
+    from .offline import FakeStreamingChatModel
+    return FakeStreamingChatModel(
+        model=model,
+        tokens_per_second=float(os.getenv('FAKE_LLM_TOKENS_PER_SECOND', '50')),
+        first_token_latency=float(os.getenv('FAKE_LLM_LATENCY', '0.2')),
+        answer_tokens=int(os.getenv('FAKE_LLM_ANSWER_TOKENS', '60')),
+    )
+
+
+@register_embeddings("cohere", "embed-english-v3.0")
+def _cohere(model: str):
+    from langchain_cohere import CohereEmbeddings
+    # max_retries=1 is a single attempt: retries come from ResilientEmbeddings, not the
+    # wrapper's fixed 4-10 second waits
+    return CohereEmbeddings(cohere_api_key=os.getenv('COHERE_API_KEY'), model=model, base_url=os.getenv('COHERE_BASE_URL'),
+                            max_retries=1, request_timeout=float(os.getenv('EMBEDDING_DOCUMENTS_TIMEOUT', '120')))
+
+
+@register_embeddings("hashing", "hashing-1024")
+def _hashing(model: str):
+    from .offline import HashingEmbeddings
+    size = int(model.rsplit("-", 1)[-1]) if model.rsplit("-", 1)[-1].isdigit() else 1024
+    return HashingEmbeddings(size=size, latency=float(os.getenv('FAKE_EMBEDDINGS_LATENCY', '0')))
@@ -0,0 +1,298 @@
+"""Deadlines, retries, hedging and circuit breaking for model and embedding calls.
+
+Every call to a provider gets a time budget. Failed attempts are retried
+after a jittered backoff only while the remaining budget covers the wait.
+Each provider has a circuit breaker: after BREAKER_FAILURES consecutive
+failures, calls fail fast with CircuitOpen for BREAKER_RESET seconds. After
+that one trial call is let through to probe for recovery. While a breaker is
+open ChatAI still answers from its caches, or serves a degraded reply built
+from the retrieved passages (see ChatAI.degraded_answer).
+
+    LLM_TIMEOUT               budget for a whole answer (default 60 s)
+    LLM_FIRST_TOKEN_TIMEOUT   retrieval plus time to first token, per attempt (20 s)
+    LLM_IDLE_TIMEOUT          longest gap between streamed tokens (15 s)
+    EMBEDDING_TIMEOUT         budget for a query embedding (5 s)
+    EMBEDDING_DOCUMENTS_TIMEOUT  budget for a batch of document embeddings (120 s)
+    EMBEDDING_HEDGE_AFTER     send a second query embedding request if the first has
+                              not answered after this many seconds (0 = no hedging)
+    RETRY_ATTEMPTS            retries after the first attempt (2)
+    RETRY_BASE_DELAY / RETRY_MAX_DELAY  backoff bounds (0.25 s / 2 s)
+    BREAKER_FAILURES / BREAKER_RESET    breaker threshold (5) and open time (30 s)
+
+Streams are only retried before their first token; a stream that stalls
+midway ends with the text received so far.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '60'))
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv('LLM_FIRST_TOKEN_TIMEOUT', '20'))
+LLM_IDLE_TIMEOUT = float(os.getenv('LLM_IDLE_TIMEOUT', '15'))
+EMBEDDING_TIMEOUT = float(os.getenv('EMBEDDING_TIMEOUT', '5'))
+EMBEDDING_DOCUMENTS_TIMEOUT = float(os.getenv('EMBEDDING_DOCUMENTS_TIMEOUT', '120'))
+EMBEDDING_HEDGE_AFTER = float(os.getenv('EMBEDDING_HEDGE_AFTER', '0'))
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', '2'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.25'))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '2'))
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('BREAKER_RESET', '30'))
+
+# Attempts run here so a stalled call can be abandoned; the SDK's own request
+# timeout eventually frees the worker
+_call_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider-call")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable, retrying in {retry_after:.0f} seconds")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, limit: Optional[float] = None) -> float:
+        """Seconds the next step may take: the remaining budget, capped at limit."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("deadline exceeded")
+        return remaining if limit is None else min(limit, remaining)
+
+
+class RetryPolicy:
+    def __init__(self, retries: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, attempt: int, error: BaseException, deadline: Deadline) -> Optional[float]:
+        """The wait before retrying, or None when the error is final or the budget would run out"""
+        if attempt >= self.retries or not is_retryable(error):
+            return None
+        delay = self.delay(attempt)
+        return delay if deadline.remaining() > delay else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx responses are worth another attempt"""
+    if isinstance(error, (CircuitOpen, ValueError, TypeError, KeyError)):
+        return False
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    return True
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go through now"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            waited = now - self.opened_at
+            # One trial call at a time; a trial whose caller gave up is replaced after reset_timeout
+            if waited >= self.reset_timeout and (self.trial_at is None or now - self.trial_at >= self.reset_timeout):
+                self.trial_at = now
+                return
+            self.rejected += 1
+            raise CircuitOpen(self.name, max(self.reset_timeout - waited, 0))
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_at = None
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_at is not None or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened += self.opened_at is None
+                self.opened_at = time.monotonic()
+            self.trial_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for a provider, e.g. "llm:llama3-70b-8192"."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+def hedged_call(func: Callable[[], Any], timeout: float, hedge_after: float = 0.0) -> Any:
+    """Run func in a worker, starting a second copy if the first is still running after hedge_after
+    seconds; return whichever succeeds first. Raise DeadlineExceeded after timeout."""
+    deadline = Deadline(timeout)
+    futures = [_call_pool.submit(func)]
+    if hedge_after and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            futures.append(_call_pool.submit(func))
+    pending = set(futures)
+    error = None
+    while pending and deadline.remaining() > 0:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+    if pending or error is None:
+        raise DeadlineExceeded(f"no response within {timeout:.1f} seconds")
+    raise error
+
+
+def call_with_retries(func: Callable[[], Any], breaker: Optional[CircuitBreaker], timeout: float,
+                      retry: Optional[RetryPolicy] = None, hedge_after: float = 0.0) -> Any:
+    """Call func within a budget of timeout seconds, retrying retryable failures while the budget lasts"""
+    retry = retry or RetryPolicy()
+    deadline = Deadline(timeout)
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.check()
+        try:
+            result = hedged_call(func, deadline.timeout(), hedge_after)
+        except Exception as e:
+            if breaker is not None:
+                breaker.failed()
+            delay = retry.next_delay(attempt, e, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+        else:
+            if breaker is not None:
+                breaker.succeeded()
+            return result
+
+
+async def resilient_astream(factory: Callable[[], AsyncIterator[Any]], breaker: Optional[CircuitBreaker],
+                            timeout: float = LLM_TIMEOUT, first_token_timeout: float = LLM_FIRST_TOKEN_TIMEOUT,
+                            idle_timeout: float = LLM_IDLE_TIMEOUT,
+                            retry: Optional[RetryPolicy] = None) -> AsyncIterator[Any]:
+    """Relay the stream from factory(), enforcing the deadlines; an attempt that fails before
+    its first chunk is retried with a fresh stream"""
+    retry = retry or RetryPolicy()
+    deadline = Deadline(timeout)
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.check()
+        stream = factory()
+        started = False
+        try:
+            while True:
+                step = deadline.timeout(idle_timeout if started else first_token_timeout)
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), step)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"no {'token' if started else 'first token'} within {step:.1f} seconds")
+                started = True
+                yield chunk
+        except Exception as e:
+            if not isinstance(e, CircuitOpen) and breaker is not None:
+                breaker.failed()
+            delay = None if started else retry.next_delay(attempt, e, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            if breaker is not None:
+                breaker.succeeded()
+            return
+        finally:
+            await _close(stream)
+
+
+async def _close(stream):
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+class ResilientEmbeddings(Embeddings):
+    """Embeddings with a time budget, retries, optional hedging and a breaker per model."""
+
+    def __init__(self, inner: Embeddings, name: str, timeout: float = EMBEDDING_TIMEOUT,
+                 documents_timeout: float = EMBEDDING_DOCUMENTS_TIMEOUT, hedge_after: float = EMBEDDING_HEDGE_AFTER,
+                 retry: Optional[RetryPolicy] = None):
+        self.inner = inner
+        self.breaker = get_breaker(f"embeddings:{name}")
+        self.timeout = timeout
+        self.documents_timeout = documents_timeout
+        self.hedge_after = hedge_after
+        self.retry = retry or RetryPolicy()
+
+    def embed_query(self, text: str) -> List[float]:
+        return call_with_retries(lambda: self.inner.embed_query(text), self.breaker, self.timeout, self.retry,
+                                 self.hedge_after)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return call_with_retries(lambda: self.inner.embed_documents(texts), self.breaker, self.documents_timeout,
+                                 self.retry)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
@@ -0,0 +1,90 @@
+"""Exact-match answer cache stored in the response_cache table of ai_chat.db.
+
+    python -m backends.response_cache prewarm questions.txt
+    python -m backends.response_cache export cache.jsonl
+    python -m backends.response_cache import cache.jsonl
+    python -m backends.response_cache clear
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+from utils.db_utils import init_db, get_cached_responses, save_cached_response, clear_response_cache
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def response_cache_key(question: str, prompt_template: str, model: str, k: int, corpus_version) -> str:
+    """Key an answer on everything that can change it."""
+    parts = [
+        normalize_question(question),
+        hashlib.sha256(prompt_template.encode("utf-8")).hexdigest(),
+        model,
+        str(k),
+        str(corpus_version),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def prewarm(questions_path: str):
+    """Answer every question in a file (one per line) so later askers hit the cache."""
+    from backends.ai_backend import get_engine
+
+    engine = get_engine()
+    with open(questions_path, "r") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    for number, question in enumerate(questions, 1):
+        engine.ask_question(question)
+        print(f"[{number}/{len(questions)}] {question}")
+
+
+def export_cache(output_path: str):
+    rows = get_cached_responses()
+    with open(output_path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    print(f"Exported {len(rows)} cached answers to {output_path}")
+
+
+def import_cache(input_path: str):
+    count = 0
+    with open(input_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            save_cached_response(row["cache_key"], row["question"], row["answer"],
+                                 row["model"], row["corpus_version"])
+            count += 1
+    print(f"Imported {count} cached answers from {input_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the persistent answer cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("prewarm", help="answer a file of questions").add_argument("path")
+    commands.add_parser("export", help="write cached answers as JSON lines").add_argument("path")
+    commands.add_parser("import", help="load cached answers from JSON lines").add_argument("path")
+    commands.add_parser("clear", help="remove all cached answers")
+    args = parser.parse_args(argv)
+
+    init_db()
+    if args.command == "prewarm":
+        prewarm(args.path)
+    elif args.command == "export":
+        export_cache(args.path)
+    elif args.command == "import":
+        import_cache(args.path)
+    else:
+        clear_response_cache()
+        print("Cleared the answer cache")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Route each question to a small, fast model or the large one.
+
+Enabled with ROUTER=1. The small model comes from ROUTER_SMALL_BACKEND /
+ROUTER_SMALL_MODEL (default: the LLM backend's entry in SMALL_MODELS); the
+large one is ChatAI's usual model. Which one answers is decided by a
+policy, picked by name with ROUTER_POLICY from the policies registered with
+@register_policy, or passed to ModelRouter directly:
+
+    @register_policy("always-large")
+    class AlwaysLarge:
+        def choose(self, question, signals):
+            return LARGE
+
+The router keeps per-route counts, latency, token totals and the
+escalation rate (share of questions sent to the large model).
+"""
+import os
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from .memory import count_tokens
+
+SMALL = "small"
+LARGE = "large"
+
+SMALL_MODELS = {"groq": "llama3-8b-8192", "fake": "fake-chat-small"}
+
+ROUTING_POLICIES: Dict[str, Callable[[], Any]] = {}
+
+
+def register_policy(name: str):
+    def decorator(factory):
+        ROUTING_POLICIES[name] = factory
+        return factory
+    return decorator
+
+
+def create_policy(name: str = None):
+    name = name or os.getenv('ROUTER_POLICY', 'heuristic')
+    try:
+        return ROUTING_POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown routing policy {name!r}; choose one of {', '.join(sorted(ROUTING_POLICIES))}")
+
+
+COMPLEX_PATTERN = re.compile(
+    r"\b(compare|comparison|difference|differences|versus|vs|explain|why|how does|how do|pros|cons|"
+    r"advantages|disadvantages|plan|steps|recommend|should i|analy[sz]e|summari[sz]e)\b",
+    re.IGNORECASE,
+)
+
+
+@register_policy("heuristic")
+class HeuristicPolicy:
+    """Small model for short, single, well-matched lookups; everything else escalates"""
+
+    def __init__(self, max_words: int = None, min_lexical_score: float = None):
+        self.max_words = max_words or int(os.getenv('ROUTER_MAX_WORDS', '18'))
+        self.min_lexical_score = (min_lexical_score if min_lexical_score is not None
+                                  else float(os.getenv('ROUTER_MIN_LEXICAL_SCORE', '2.0')))
+
+    def choose(self, question: str, signals: Dict[str, Any]) -> str:
+        if signals["words"] > self.max_words:
+            return LARGE
+        if signals["questions"] > 1 or COMPLEX_PATTERN.search(question):
+            return LARGE
+        if signals["follow_up"]:
+            return LARGE
+        if signals["lexical_score"] < self.min_lexical_score:
+            return LARGE
+        return SMALL
+
+
+@register_policy("always-large")
+class AlwaysLargePolicy:
+    def choose(self, question: str, signals: Dict[str, Any]) -> str:
+        return LARGE
+
+
+@register_policy("always-small")
+class AlwaysSmallPolicy:
+    def choose(self, question: str, signals: Dict[str, Any]) -> str:
+        return SMALL
+
+
+class RouteStats:
+    def __init__(self, model: str, window: int = 1000):
+        self.model = model
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)
+        self.ttfts = deque(maxlen=window)
+
+
+class ModelRouter:
+    def __init__(self, small, large, policy=None, lexical_index: Optional[Callable[[], Any]] = None):
+        """`small` and `large` are (chat model, model name); lexical_index returns the BM25 index"""
+        self.models = {SMALL: small, LARGE: large}
+        self.policy = policy or create_policy()
+        self.lexical_index = lexical_index
+        self._stats = {route: RouteStats(name) for route, (_, name) in self.models.items()}
+        self._lock = threading.Lock()
+
+    def signals(self, question: str, history: str = "") -> Dict[str, Any]:
+        lexical_score = 0.0
+        if self.lexical_index is not None:
+            best = self.lexical_index().search(question, 1)
+            lexical_score = best[0][1] if best else 0.0
+        return {
+            "words": count_tokens(question),
+            "questions": max(question.count("?"), 1),
+            # ChatAI only passes history for follow-ups it rewrote from the student's conversation
+            "follow_up": bool(history),
+            "lexical_score": lexical_score,
+        }
+
+    def route(self, question: str, history: str = "") -> str:
+        route = self.policy.choose(question, self.signals(question, history))
+        return route if route in self.models else LARGE
+
+    def model(self, route: str):
+        return self.models[route][0]
+
+    def model_name(self, route: str) -> str:
+        return self.models[route][1]
+
+    def record(self, route: str, latency: float, ttft: Optional[float], prompt_tokens: int, answer_tokens: int):
+        with self._lock:
+            stats = self._stats[route]
+            stats.requests += 1
+            stats.input_tokens += prompt_tokens
+            stats.output_tokens += answer_tokens
+            stats.latencies.append(latency)
+            if ttft is not None:
+                stats.ttfts.append(ttft)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(stats.requests for stats in self._stats.values())
+            routes = {}
+            for route, stats in self._stats.items():
+                latencies = sorted(stats.latencies)
+                ttfts = sorted(stats.ttfts)
+                routes[route] = {
+                    "model": stats.model,
+                    "requests": stats.requests,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+                    "p50_ttft_s": ttfts[len(ttfts) // 2] if ttfts else None,
+                }
+            escalations = self._stats[LARGE].requests
+        return {"requests": total, "escalation_rate": escalations / total if total else 0.0, "routes": routes}
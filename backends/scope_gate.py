@@ -0,0 +1,109 @@
+"""Decide before generation whether a question can be answered from the corpus.
+
+The prompt in ChatAI tells the model to reply with a fixed sentence for
+questions outside the department's scope, or when the context lacks the
+answer. The gate returns those same sentences directly when the signals
+are clear enough, saving the retrieval and generation round-trip:
+
+  coverage   share of the question's content words that occur in the corpus
+             (the BM25 index vocabulary), free to compute
+  relevance  cosine similarity of the best chunk, only computed when
+             coverage alone is inconclusive
+  domain     whether the question names the department or institution
+
+Similarities depend on the embedding model, so calibrate the thresholds
+for the deployed one with `python -m benchmarks.eval_scope_gate --sweep`.
+"""
+from typing import Dict, Optional
+
+from .lexical import tokenize
+from .numpy_store import NumpyVectorStore
+
+IN_SCOPE = "in_scope"
+OUT_OF_SCOPE = "out_of_scope"
+NOT_IN_KNOWLEDGE_BASE = "not_in_kb"
+UNSURE = "unsure"
+
+NOT_FOUND_RESPONSE = ("Based on my information about the Computer Science Department at Akanu Ibiam Federal "
+                      "Polytechnic Unwana, I don't have specific details about that. You may want to contact the "
+                      "department directly for more information.")
+OUT_OF_SCOPE_RESPONSE = ("I'm specifically designed to answer questions about the Computer Science Department at "
+                         "Akanu Ibiam Federal Polytechnic Unwana. Your question appears to be outside that scope. Is "
+                         "there something specific about the department or institution I can help you with?")
+CANNED_RESPONSES = {OUT_OF_SCOPE: OUT_OF_SCOPE_RESPONSE, NOT_IN_KNOWLEDGE_BASE: NOT_FOUND_RESPONSE}
+
+DOMAIN_TERMS = {
+    "department", "dept", "csc", "computer", "computing", "polytechnic", "poly", "akanu", "ibiam", "unwana",
+    "afpu", "hod", "lecturer", "lecturers", "course", "courses", "nd", "hnd", "admission", "semester", "student",
+    "students", "programme", "program", "laboratory", "lab", "exam", "exams", "project", "siwes", "staff",
+}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "at", "to", "for", "and", "or", "what",
+    "who", "whom", "which", "when", "where", "why", "how", "do", "does", "did", "can", "could", "i", "me", "my",
+    "you", "your", "it", "its", "this", "that", "there", "about", "tell", "please", "with", "from", "by", "any",
+    "have", "has", "should", "would", "will", "we", "our", "us", "much", "many", "some", "as", "if", "so", "than",
+}
+
+
+class ScopeGate:
+    def __init__(self, vectorstore, lexical_index, coverage_in: float = 0.6, coverage_out: float = 0.25,
+                 relevance_in: float = 0.45, relevance_out: float = 0.25, relevance_kb: float = 0.2):
+        self.vectorstore = vectorstore
+        self.vocabulary = set(lexical_index.idf)
+        self.coverage_in = coverage_in
+        self.coverage_out = coverage_out
+        self.relevance_in = relevance_in
+        self.relevance_out = relevance_out
+        self.relevance_kb = relevance_kb
+
+    def coverage(self, question: str) -> Optional[float]:
+        words = [word for word in tokenize(question) if word not in STOPWORDS]
+        if not words:
+            return None
+        return sum(word in self.vocabulary or word in DOMAIN_TERMS for word in words) / len(words)
+
+    def relevance(self, question: str) -> float:
+        results = self.vectorstore.similarity_search_with_score(question, k=1)
+        if not results:
+            return 0.0
+        score = results[0][1]
+        if isinstance(self.vectorstore, NumpyVectorStore):
+            return score
+        # Chroma returns squared L2 distance; for unit-length embeddings cosine = 1 - d / 2
+        return 1.0 - score / 2.0
+
+    def signals(self, question: str, with_relevance: bool = True) -> Dict[str, object]:
+        return {
+            "coverage": self.coverage(question),
+            "domain": any(word in DOMAIN_TERMS for word in tokenize(question)),
+            "relevance": self.relevance(question) if with_relevance else None,
+        }
+
+    def decide(self, signals: Dict[str, object]) -> str:
+        coverage, relevance = signals["coverage"], signals["relevance"]
+        if coverage is None:
+            return UNSURE
+        if coverage >= self.coverage_in:
+            return IN_SCOPE
+        if relevance is None:
+            return UNSURE
+        if relevance >= self.relevance_in:
+            return IN_SCOPE
+        if signals["domain"]:
+            return NOT_IN_KNOWLEDGE_BASE if relevance < self.relevance_kb else UNSURE
+        if coverage <= self.coverage_out and relevance < self.relevance_out:
+            return OUT_OF_SCOPE
+        return UNSURE
+
+    def classify(self, question: str) -> str:
+        """Verdict for a question; the embedding call is skipped when word coverage settles it"""
+        signals = self.signals(question, with_relevance=False)
+        verdict = self.decide(signals)
+        if verdict == UNSURE and signals["coverage"] is not None:
+            signals["relevance"] = self.relevance(question)
+            verdict = self.decide(signals)
+        return verdict
+
+    def canned_response(self, question: str) -> Optional[str]:
+        """The fixed reply for a confidently out-of-scope or unanswerable question, else None"""
+        return CANNED_RESPONSES.get(self.classify(question))
@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Generator, List, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def replay_answer(answer: str, chunk_chars: int = 12) -> Generator[str, None, None]:
+    """Yield a stored answer in small pieces so it renders like a live stream."""
+    piece = ""
+    for token in re.split(r"(\s+)", answer):
+        piece += token
+        if len(piece) >= chunk_chars:
+            yield piece
+            piece = ""
+    if piece:
+        yield piece
+
+
+class QueryEmbeddingMemo(Embeddings):
+    """Remembers the latest query embeddings, so the semantic cache lookup, the
+    retriever, the scope gate and the cache store embed a question only once."""
+
+    def __init__(self, inner: Embeddings, max_entries: int = 64):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.hits = 0
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._vectors.get(text)
+            if vector is not None:
+                self._vectors.move_to_end(text)
+                self.hits += 1
+                return vector
+        vector = self.inner.embed_query(text)
+        with self._lock:
+            self._vectors[text] = vector
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class SemanticCache:
+    """Answers keyed by question embedding, matched by cosine similarity.
+
+    Entries are evicted least-recently-used beyond `max_entries`, expire
+    after `ttl` seconds, and are all dropped when the corpus version changes.
+    An entry only matches lookups for the model that wrote the answer.
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, max_entries: int = 256, ttl: float = 3600):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.corpus_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, corpus_version):
+        if corpus_version != self.corpus_version:
+            self._entries.clear()
+            self.corpus_version = corpus_version
+
+    def _expire(self, now: float):
+        for key in [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]:
+            del self._entries[key]
+
+    def lookup(self, question: str, corpus_version=None, model=None) -> Union[str, None]:
+        """Return a cached answer for a sufficiently similar question, if any."""
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version(corpus_version)
+            self._expire(time.monotonic())
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry["model"] != model:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["answer"]
+
+    def store(self, question: str, answer: str, corpus_version=None, model=None):
+        if not answer:
+            return
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version(corpus_version)
+            self._entries[self._next_key] = {
+                "question": question,
+                "vector": vector,
+                "answer": answer,
+                "model": model,
+                "created": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,93 @@
+"""Generation wasted on abandoned answers, with and without cancellation.
+
+    python -m benchmarks.bench_cancellation [--users 20] [--read 10] [--answer-tokens 200]
+
+Each simulated user asks a different question and walks away after --read
+chunks (a new message, a cleared chat or a closed tab). The stream is left
+the way chat_page leaves it: the `cancelled` check starts returning True
+and, for the baseline, the generator is simply dropped as a Streamlit rerun
+used to do while the shared generation ran on. Reported: chunks pulled from
+the model, how long generations kept running after their users left, and
+how many answers were cached anyway. Runs offline with the fake chat model.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+
+def run(engine, questions, read):
+    pulled = [0]
+    finished = []
+    generate = engine._astream_response
+
+    async def counting(chain, query, history=""):
+        try:
+            async for chunk in generate(chain, query, history):
+                pulled[0] += 1
+                yield chunk
+        finally:
+            finished.append(time.perf_counter())
+
+    engine._astream_response = counting
+    left = []
+
+    def user(question):
+        leaving = threading.Event()
+        stream = engine.stream_answer(question, cancelled=leaving.is_set)
+        try:
+            for index, _ in enumerate(stream):
+                if index + 1 == read:
+                    left.append(time.perf_counter())
+                    leaving.set()
+                    break
+        except Exception:
+            pass
+        stream.close()
+
+    threads = [threading.Thread(target=user, args=(question,)) for question in questions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    while engine.single_flight.stats()["inflight"]:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    engine._astream_response = generate
+    cached = sum(engine.lookup_cached_answer(question) is not None for question in questions)
+    return pulled[0], max(finished) - min(left), cached
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--read", type=int, default=10, help="chunks each user reads before leaving")
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({"LLM_BACKEND": "fake", "EMBEDDINGS_BACKEND": "hashing", "FAKE_LLM_LATENCY": "0.05",
+                           "FAKE_LLM_TOKENS_PER_SECOND": "100", "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+                           "AI_CHAT_DB": os.path.join(directory, "bench.db")})
+        from backends.ai_backend import ChatAI
+        from utils.db_utils import close_connections, init_db
+
+        init_db()
+        engine = ChatAI(persist_directory=directory)
+        print(f"{args.users} users, each leaving after {args.read} of ~{args.answer_tokens} chunks\n")
+        print(f"{'':<14} {'chunks pulled':>14} {'ran on after leaving':>21} {'answers cached':>15}")
+        for label, cancel in (("no cancel", False), ("cancellation", True)):
+            if not cancel:
+                # What happened before: leaving detached nothing and the generation ran to the end
+                engine.single_flight.leave = lambda key, flight: None
+            else:
+                del engine.single_flight.leave
+            questions = [f"What is taught in course CSC {100 + index} ({label})?" for index in range(args.users)]
+            pulled, ran_on, cached = run(engine, questions, args.read)
+            print(f"{label:<14} {pulled:>14} {ran_on:>19.2f} s {cached:>15}")
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
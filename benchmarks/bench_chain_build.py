@@ -0,0 +1,53 @@
+"""Per-request cost of building the QA chain vs reusing the compiled one.
+
+    python -m benchmarks.bench_chain_build [--iterations 2000]
+
+Runs offline: the LLM and embeddings are langchain fakes and the index is
+built in a temporary directory.
+"""
+import argparse
+import tempfile
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from backends.ai_backend import ChatAI
+
+
+def time_per_call(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        engine = ChatAI(
+            llm=FakeListChatModel(responses=["ok"]),
+            embeddings_model=DeterministicFakeEmbedding(size=256),
+            persist_directory=persist_directory,
+        )
+        engine.get_qa_chain()
+
+        def rebuild_chain():
+            # What every question used to pay: reparse the template and recompose the chain
+            ChatPromptTemplate.from_template(engine.prompt_template)
+            engine.setup_qa_chain(engine.vectorstore)
+
+        rebuild = time_per_call(rebuild_chain, args.iterations)
+        cached = time_per_call(engine.get_qa_chain, args.iterations)
+
+    print(f"rebuild per request:        {rebuild * 1e6:9.1f} us")
+    print(f"get_qa_chain per request:   {cached * 1e6:9.1f} us")
+    print(f"saved per request:          {(rebuild - cached) * 1e6:9.1f} us ({rebuild / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Chat-history database under concurrent sessions: legacy access vs the pooled WAL layer.
+
+    python -m benchmarks.bench_db [--sessions 32] [--turns 50] [--history 2000]
+
+Each simulated session runs in its own thread, like a Streamlit script run,
+and for every turn saves a user and an assistant message and reloads its
+history. "legacy" opens a new connection per call in rollback-journal mode
+without the messages(username, id) index (the previous db_utils);
+"pooled" uses utils.db_utils synchronously and "batched" queues the
+writes through save_message_async (group commit, read-your-writes).
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from utils import db_utils
+
+
+class LegacyDB:
+    def __init__(self, path: str):
+        self.path = path
+
+    def save_message(self, username, role, content, timestamp):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('INSERT INTO messages (username, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                     (username, role, content, timestamp))
+        conn.commit()
+        conn.close()
+
+    def get_user_messages(self, username):
+        conn = sqlite3.connect(self.path, timeout=30)
+        rows = conn.execute('SELECT role, content, timestamp FROM messages WHERE username = ? ORDER BY id ASC',
+                            (username,)).fetchall()
+        conn.close()
+        return rows
+
+
+class BatchedDB:
+    save_message = staticmethod(db_utils.save_message_async)
+    get_user_messages = staticmethod(db_utils.get_user_messages)
+
+
+def prepare(path: str, legacy: bool, users: int, history: int):
+    """Create the schema and seed `history` old messages per user."""
+    db_utils.DB_PATH = path
+    db_utils.init_db()
+    with db_utils.get_connection() as conn:
+        conn.executemany('INSERT INTO messages (username, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                         [(f"student{user % users}", "user", "x" * 200, "12:00") for user in range(users * history)])
+    db_utils.close_connections()
+    if legacy:
+        conn = sqlite3.connect(path)
+        conn.execute('DROP INDEX IF EXISTS idx_messages_username_id')
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+
+def run(kind: str, sessions: int, turns: int, history: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        prepare(path, kind == "legacy", sessions * 4, history)
+        backend = {"legacy": LegacyDB(path), "pooled": db_utils, "batched": BatchedDB}[kind]
+        read_latencies = []
+        write_latencies = []
+        write_count = [0]
+        lock = threading.Lock()
+
+        def session(number: int):
+            username = f"student{number}"
+            local_reads = []
+            local_writes = []
+            for turn in range(turns):
+                start = time.perf_counter()
+                backend.save_message(username, "user", f"question {turn}", "12:00")
+                backend.save_message(username, "assistant", "answer " * 40, "12:00")
+                local_writes.append((time.perf_counter() - start) / 2)
+                start = time.perf_counter()
+                backend.get_user_messages(username)
+                local_reads.append(time.perf_counter() - start)
+            with lock:
+                read_latencies.extend(local_reads)
+                write_latencies.extend(local_writes)
+                write_count[0] += turns * 2
+
+        threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        db_utils.flush_messages()
+        elapsed = time.perf_counter() - start
+        db_utils.close_connections()
+
+    read_latencies.sort()
+    write_latencies.sort()
+    return {
+        "write_p50_ms": write_latencies[len(write_latencies) // 2] * 1000,
+        "writes_per_s": write_count[0] / elapsed,
+        "read_p50_ms": read_latencies[len(read_latencies) // 2] * 1000,
+        "read_p95_ms": read_latencies[int(len(read_latencies) * 0.95)] * 1000,
+        "seconds": elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--history", type=int, default=2000, help="seeded messages per user")
+    args = parser.parse_args(argv)
+
+    print(f"{'access':<8} {'writes/s':>9} {'write p50 ms':>13} {'read p50 ms':>12} {'read p95 ms':>12} {'total s':>8}")
+    for kind in ("legacy", "pooled", "batched"):
+        result = run(kind, args.sessions, args.turns, args.history)
+        print(f"{kind:<8} {result['writes_per_s']:>9.0f} {result['write_p50_ms']:>13.3f} {result['read_p50_ms']:>12.2f} "
+              f"{result['read_p95_ms']:>12.2f} {result['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
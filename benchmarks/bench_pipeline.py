@@ -0,0 +1,200 @@
+"""Stage-by-stage latency of the ChatAI pipeline.
+
+    python -m benchmarks.bench_pipeline [--sizes 7 500 2000] [--k 3 5 10] [--output results.json]
+
+Stages timed separately:
+  load_chunk    parse and split data.docx
+  index_cold    build the vector index in an empty directory
+  index_warm    reopen the persisted index (second ChatAI start)
+  embed_query   embed one question
+  search        vector search with a precomputed query vector
+  retrieve      the configured retriever end to end (embedding + search, or hybrid);
+                cold with an empty query-vector memo, warm with the same questions again
+  pack          merge, dedupe and budget the retrieved chunks (backends/context_packing.py)
+  prompt        prompt template rendering of the packed context
+  ttft / tokens_per_s / total  streamed answer through _stream_response
+
+By default the offline backends are used (hashing embeddings, fake LLM with
+no artificial delay) so the numbers are the pipeline's own overhead; pass
+--live to use whatever LLM_BACKEND / EMBEDDINGS_BACKEND are configured.
+Results are written as JSON, tagged with the current git commit, so runs
+from different commits can be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks.bench_vectorstore import synthetic_chunks
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+
+def timed(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples), result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def stream_stats(engine, question: str):
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    for chunk in engine._stream_response(engine.get_qa_chain(), question):
+        if first is None:
+            first = time.perf_counter()
+        tokens += 1
+    end = time.perf_counter()
+    first = first or end
+    return {
+        "ttft_ms": (first - start) * 1000,
+        "total_ms": (end - start) * 1000,
+        "tokens_per_s": tokens / (end - first) if end > first else 0.0,
+    }
+
+
+def run(sizes, ks, repeat: int, questions):
+    from langchain_core.documents import Document
+
+    from backends.ai_backend import ChatAI, load_and_process_document, sync_vectorstore
+
+    results = {"stages": [], "context_tokens": []}
+
+    def record(stage, corpus_size, k, stats, variant=""):
+        results["stages"].append(dict(stats, stage=stage, corpus_size=corpus_size, k=k, variant=variant))
+
+    document = os.path.join(os.path.dirname(os.path.dirname(__file__)), "backends", "data.docx")
+    stats, _ = timed(lambda: load_and_process_document(document), repeat)
+    record("load_chunk", 0, 0, stats)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        engine = ChatAI(persist_directory=directory)
+        record("index_cold", 0, 0, summarize([time.perf_counter() - start]))
+        stats, engine = timed(lambda: ChatAI(persist_directory=directory), repeat)
+        record("index_warm", 0, 0, stats)
+
+        # Past the memo of recent query vectors, so every repeat reaches the model
+        stats, _ = timed(lambda: engine.embeddings_model.inner.embed_query(questions[0]), repeat)
+        record("embed_query", 0, 0, stats)
+
+        for size in sizes:
+            texts = synthetic_chunks(size) if size > len(engine.vectorstore.get(include=[])["ids"]) else None
+            if texts:
+                engine.persist_directory = os.path.join(directory, f"synthetic-{size}")
+                engine.vectorstore = engine.open_vectorstore()
+                sync_vectorstore(engine.vectorstore, [Document(page_content=text) for text in texts])
+                engine._lexical_index = None
+            vectors = [engine.embeddings_model.embed_query(question) for question in questions]
+
+            for k in ks:
+                engine.k = k
+                search_samples = []
+                for _ in range(repeat):
+                    for vector in vectors:
+                        start = time.perf_counter()
+                        docs = engine.vectorstore.similarity_search_by_vector(vector, k=k)
+                        search_samples.append(time.perf_counter() - start)
+                record("search", size, k, summarize(search_samples))
+
+                # Cold: no query vectors memoized yet; warm: the same questions again
+                for variant in ("cold", "warm"):
+                    if variant == "cold":
+                        engine.embeddings_model.clear()
+                        retriever = engine.get_retriever()
+                    retrieve_samples = []
+                    for question in questions:
+                        start = time.perf_counter()
+                        docs = retriever.invoke(question)
+                        retrieve_samples.append(time.perf_counter() - start)
+                    record("retrieve", size, k, summarize(retrieve_samples), variant)
+
+                stats, packed = timed(lambda: engine.context_packer.pack(docs), repeat)
+                record("pack", size, k, stats)
+                results["context_tokens"].append({"corpus_size": size, "k": k, "raw": packed.raw_tokens,
+                                                  "packed": packed.tokens, "saved": packed.tokens_saved})
+                stats, _ = timed(
+                    lambda: engine.prompt.invoke({"context": packed.text, "question": questions[0], "history": ""}),
+                    repeat)
+                record("prompt", size, k, stats)
+
+                streams = [stream_stats(engine, question) for question in questions]
+                for metric in ("ttft_ms", "total_ms", "tokens_per_s"):
+                    values = [stream[metric] for stream in streams]
+                    results["stages"].append({
+                        "stage": metric.rsplit("_ms", 1)[0], "corpus_size": size, "k": k, "variant": "",
+                        "n": len(values), "mean": statistics.fmean(values),
+                        "p50": sorted(values)[len(values) // 2],
+                    })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 500, 2000], help="corpus sizes in chunks")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--live", action="store_true", help="use the configured backends instead of offline ones")
+    args = parser.parse_args(argv)
+
+    if not args.live:
+        os.environ.update({
+            "LLM_BACKEND": "fake",
+            "EMBEDDINGS_BACKEND": "hashing",
+            "FAKE_LLM_LATENCY": "0",
+            "FAKE_LLM_TOKENS_PER_SECOND": "0",
+        })
+    questions = [
+        "What are the admission requirements for ND Computer Science?",
+        "Who is the head of department?",
+        "Which courses are taught in HND 1?",
+        "Where is the computer laboratory?",
+    ]
+    results = run(args.sizes, args.k, args.repeat, questions)
+    results.update({
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "backends": {key: os.getenv(key, "") for key in ("LLM_BACKEND", "EMBEDDINGS_BACKEND", "VECTOR_STORE",
+                                                           "RETRIEVAL_MODE")},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for row in results["stages"]:
+        value = row.get("p50_ms", row.get("p50"))
+        unit = "tok/s" if row["stage"] == "tokens_per_s" else "ms"
+        print(f"{row['stage']:<13} {row['variant']:<5} size={row['corpus_size']:<5} k={row['k']:<3} p50={value:9.3f} {unit}")
+    for row in results["context_tokens"]:
+        print(f"context       size={row['corpus_size']:<5} k={row['k']:<3} tokens {row['raw']} -> {row['packed']} "
+              f"(saved {row['saved']})")
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Fault-injection checks for the deadlines, retries, hedging and circuit breakers.
+
+    python -m benchmarks.bench_resilience
+
+Starts a local stand-in for the Groq chat completions and Cohere embed
+endpoints, points the real SDK clients at it (GROQ_BASE_URL /
+COHERE_BASE_URL) and runs ChatAI through a series of faults: slow
+embedding tails, intermittent 503s, a model that never sends a first token,
+one that stalls midway, an embedding outage and the recovery afterwards.
+Every scenario prints its measurements and PASS/FAIL checks; the exit status
+is non-zero if any check fails. Timeouts are shortened (see TIMEOUTS) so the
+run takes about half a minute.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIMEOUTS = {
+    "LLM_TIMEOUT": "4",
+    "LLM_FIRST_TOKEN_TIMEOUT": "1.5",
+    "LLM_IDLE_TIMEOUT": "0.5",
+    "EMBEDDING_TIMEOUT": "1.5",
+    "RETRY_ATTEMPTS": "2",
+    "RETRY_BASE_DELAY": "0.05",
+    "RETRY_MAX_DELAY": "0.2",
+    "BREAKER_FAILURES": "3",
+    "BREAKER_RESET": "1.5",
+}
+
+
+class Faults:
+    """What the stand-in does to the next requests on one endpoint."""
+
+    def __init__(self):
+        self.latency = 0.0        # wait before answering
+        self.fail_every = 0       # every n-th request gets `status` (1 = all of them)
+        self.status = 503
+        self.slow_every = 0       # every n-th request waits slow_latency instead (tail latency)
+        self.slow_latency = 0.0
+        self.stall_after = None   # chat: stop sending after this many tokens and hold the connection
+        self.requests = 0
+        self.failed = 0
+
+
+class StandInServer:
+    def __init__(self, answer_tokens=20, token_delay=0.005):
+        from backends.offline import HashingEmbeddings
+
+        self.chat = Faults()
+        self.embed = Faults()
+        self.answer_tokens = answer_tokens
+        self.token_delay = token_delay
+        self.vectors = HashingEmbeddings()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stand-in", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        self.chat, self.embed = Faults(), Faults()
+
+    def _admit(self, faults):
+        """Apply the latency faults; return False if this request should fail"""
+        with self._lock:
+            faults.requests += 1
+            count = faults.requests
+        if faults.slow_every and count % faults.slow_every == 0:
+            time.sleep(faults.slow_latency)
+        elif faults.latency:
+            time.sleep(faults.latency)
+        if faults.fail_every and count % faults.fail_every == 0:
+            with self._lock:
+                faults.failed += 1
+            return False
+        return True
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/embed"):
+                    self.embed(body)
+                elif self.path.endswith("/chat/completions"):
+                    self.chat(body)
+                else:
+                    self.send_json(404, {"message": "not found"})
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def embed(self, body):
+                faults = stand_in.embed
+                if not stand_in._admit(faults):
+                    return self.send_json(faults.status, {"message": "injected failure"})
+                vectors = stand_in.vectors.embed_documents(body["texts"])
+                self.send_json(200, {"id": "embed", "texts": body["texts"], "embeddings": {"float": vectors},
+                                     "response_type": "embeddings_by_type",
+                                     "meta": {"billed_units": {"input_tokens": len(body["texts"])}}})
+
+            def chat(self, body):
+                faults = stand_in.chat
+                if not stand_in._admit(faults):
+                    return self.send_json(faults.status, {"error": {"message": "injected failure"}})
+                tokens = [f"word{index} " for index in range(stand_in.answer_tokens)]
+                if not body.get("stream"):
+                    return self.send_json(200, {
+                        "id": "chat", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1},
+                    })
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for index, token in enumerate(tokens):
+                    if faults.stall_after is not None and index == faults.stall_after:
+                        time.sleep(30)
+                        return
+                    self.event({"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None},
+                               body["model"])
+                    time.sleep(stand_in.token_delay)
+                self.event({"index": 0, "delta": {}, "finish_reason": "stop"}, body["model"])
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def event(self, choice, model):
+                chunk = {"id": "chat", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [choice]}
+                try:
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def check(self, name, ok, detail=""):
+        self.failed += not ok
+        print(f"  {'PASS' if ok else 'FAIL'}  {name}{f'  ({detail})' if detail else ''}")
+
+
+def ask(engine, question):
+    start = time.perf_counter()
+    answer = "".join(engine.stream_answer(question))
+    return answer, time.perf_counter() - start
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main(argv=None):
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(TIMEOUTS)
+        os.environ.update({"AI_CHAT_DB": os.path.join(directory, "bench.db"), "LLM_BACKEND": "groq",
+                           "EMBEDDINGS_BACKEND": "cohere", "GROQ_API_KEY": "stand-in", "COHERE_API_KEY": "stand-in",
+                           "ROUTER": "0", "SCOPE_GATE": "0"})
+        server = StandInServer().start()
+        os.environ.update({"GROQ_BASE_URL": server.url, "COHERE_BASE_URL": server.url})
+
+        from backends.ai_backend import INTERRUPTED_NOTE, ChatAI
+        from backends.resilience import get_breaker
+        from utils.db_utils import close_connections, init_db
+
+        init_db()
+        engine = ChatAI(persist_directory=directory)
+        # Only exact repeats should hit the cache in these runs
+        engine.semantic_cache.threshold = 1.01
+        llm_breaker = get_breaker(f"llm:{engine.model_name}")
+        embeddings = engine.embeddings_model.inner
+        checks = Checks()
+
+        def degraded(answer):
+            return "can't reach the AI service" in answer
+
+        print("healthy")
+        results = [ask(engine, f"What courses are taught in year {year} of the ND program?") for year in (1, 2, 3)]
+        cached_question, cached_answer = "What courses are taught in year 1 of the ND program?", results[0][0]
+        print(f"  p50 answer {percentile([elapsed for _, elapsed in results], 0.5) * 1000:.0f} ms")
+        checks.check("answers complete", all(answer.startswith("word0") and not degraded(answer)
+                                             for answer, _ in results))
+
+        print("embedding tail latency (every 2nd request +0.8 s)")
+        server.embed.slow_every, server.embed.slow_latency = 2, 0.8
+        for hedge_after in (0.0, 0.1):
+            embeddings.hedge_after = hedge_after
+            samples = []
+            for index in range(10):
+                start = time.perf_counter()
+                embeddings.embed_query(f"lecturers in the department {hedge_after} {index}")
+                samples.append(time.perf_counter() - start)
+            label = f"hedge after {hedge_after}s" if hedge_after else "no hedging"
+            print(f"  {label:<17} p50 {percentile(samples, 0.5) * 1000:6.0f} ms  p95 {percentile(samples, 0.95) * 1000:6.0f} ms")
+            if hedge_after:
+                checks.check("hedged p95 under 0.4 s", percentile(samples, 0.95) < 0.4)
+            else:
+                checks.check("unhedged p95 over 0.7 s", percentile(samples, 0.95) > 0.7)
+        embeddings.hedge_after = 0.0
+        server.reset()
+
+        print("intermittent 503s (every 2nd chat request)")
+        server.chat.fail_every = 2
+        results = [ask(engine, f"Who teaches course CSC {code}?") for code in (101, 102, 103, 104, 105, 106)]
+        print(f"  {server.chat.failed} injected failures, max answer {max(e for _, e in results) * 1000:.0f} ms")
+        checks.check("every answer complete after retries",
+                     all(answer.startswith("word0") and not degraded(answer) for answer, _ in results))
+        checks.check("breaker stayed closed", llm_breaker.state == "closed")
+        server.reset()
+
+        print("model never sends a first token")
+        server.chat.latency = 30
+        results = [ask(engine, f"What is the department's policy on exam {number}?") for number in (1, 2, 3, 4)]
+        for index, (answer, elapsed) in enumerate(results):
+            print(f"  question {index + 1}: {elapsed * 1000:6.0f} ms  degraded={degraded(answer)}  "
+                  f"breaker={llm_breaker.state}")
+        checks.check("first answer within LLM_TIMEOUT", results[0][1] <= float(TIMEOUTS["LLM_TIMEOUT"]) + 0.5)
+        checks.check("degraded replies served", all(degraded(answer) for answer, _ in results))
+        checks.check("breaker opened", llm_breaker.opened >= 1)
+        checks.check("open breaker fails fast", results[-1][1] < 0.3, f"{results[-1][1] * 1000:.0f} ms")
+        answer, elapsed = ask(engine, cached_question)
+        checks.check("cached answer still served", answer == cached_answer, f"{elapsed * 1000:.0f} ms")
+
+        print("recovery")
+        server.reset()
+        time.sleep(float(TIMEOUTS["BREAKER_RESET"]))
+        answer, elapsed = ask(engine, "What are the admission requirements for HND?")
+        print(f"  answer {elapsed * 1000:.0f} ms  breaker={llm_breaker.state}")
+        checks.check("trial call succeeds and closes the breaker",
+                     answer.startswith("word0") and llm_breaker.state == "closed")
+
+        print("model stalls after 5 tokens")
+        server.chat.stall_after = 5
+        answer, elapsed = ask(engine, "Where is the computer laboratory located?")
+        print(f"  answer {elapsed * 1000:.0f} ms: {answer[:60]!r}...")
+        checks.check("partial answer kept and marked",
+                     answer.startswith("word0 word1") and answer.endswith(INTERRUPTED_NOTE))
+        checks.check("cut off within LLM_IDLE_TIMEOUT", elapsed < float(TIMEOUTS["LLM_IDLE_TIMEOUT"]) + 0.5)
+        server.reset()
+
+        print("embedding outage")
+        server.embed.fail_every = 1
+        answer, elapsed = ask(engine, "Who is the head of the department?")
+        print(f"  answer {elapsed * 1000:.0f} ms  embeddings breaker={embeddings.breaker.state}")
+        checks.check("answered from BM25 retrieval", answer.startswith("word0") and not degraded(answer))
+        server.reset()
+
+        server.stop()
+        close_connections()
+        print(f"\n{'all checks passed' if not checks.failed else f'{checks.failed} checks failed'}")
+        return 1 if checks.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Latency and token use with and without small/large model routing.
+
+    python -m benchmarks.bench_router [--policy heuristic] [--live]
+
+Streams a question mix (the in-scope questions of scope_questions.jsonl,
+multi-part and comparison questions, and follow-ups) through
+ChatAI.stream_answer twice, the way the chat page asks them: each question
+comes after the welcome greeting, follow-ups after an earlier exchange. The
+first pass puts every question on the large model, the second is routed.
+The answer caches are bypassed so every question is generated. Offline, the two
+models are fake chat models where the small one starts and streams faster,
+so the numbers show the routing overhead and the share of traffic moved, not
+real model speed; --live uses the configured backend and its SMALL_MODELS
+entry (or ROUTER_SMALL_MODEL). Answer quality is not scored here: review the
+per-question routes and answers of the small model before enabling ROUTER=1.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+COMPLEX_QUESTIONS = [
+    "Compare the ND and HND programmes in Computer Science and explain which one I should choose.",
+    "What are the admission requirements for ND, and how do they differ from HND?",
+    "Explain why the department emphasizes practical skills and how the laboratory supports that.",
+    "Summarize the final year projects students have built and the technologies they used.",
+    "Who is the Chief Lecturer? Who is the chief technologist?",
+    "What are the pros and cons of studying Computer Science at Akanu Ibiam Federal Polytechnic?",
+]
+
+# Asked after EARLIER_EXCHANGE, so they are rewritten with the conversation
+FOLLOW_UPS = ["And in HND?", "Who teaches them?", "What about the second semester?"]
+WELCOME = {"role": "assistant", "content": "Hello bench! How can I help you today?"}
+EARLIER_EXCHANGE = [
+    WELCOME,
+    {"role": "user", "content": "What courses are taught in ND 1?"},
+    {"role": "assistant", "content": "ND 1 covers introductory programming, computer applications and mathematics."},
+]
+
+
+def load_questions(path):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    questions = [row["question"] for row in rows if row["label"] == "in_scope"] + COMPLEX_QUESTIONS
+    return [(question, [WELCOME]) for question in questions] + [(question, EARLIER_EXCHANGE) for question in FOLLOW_UPS]
+
+
+def run(engine, questions):
+    def answer(question, messages):
+        start = time.perf_counter()
+        first = None
+        text = ""
+        for piece in engine.stream_answer(question, username="bench", messages=messages):
+            if first is None and piece:
+                first = time.perf_counter()
+            text += piece
+        end = time.perf_counter()
+        return end - start, (first or end) - start, text
+
+    return [answer(question, messages) for question, messages in questions]
+
+
+def summarize(label, results):
+    latencies = sorted(latency for latency, _, _ in results)
+    ttfts = sorted(ttft for _, ttft, _ in results)
+    total = sum(latencies)
+    print(f"{label:<10} total {total:7.2f} s  p50 latency {latencies[len(latencies) // 2] * 1000:7.1f} ms  "
+          f"p50 ttft {ttfts[len(ttfts) // 2] * 1000:7.1f} ms")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=os.path.join(os.path.dirname(__file__), "scope_questions.jsonl"))
+    parser.add_argument("--policy", default=None, help="routing policy (default: ROUTER_POLICY or heuristic)")
+    parser.add_argument("--live", action="store_true", help="use the configured backends instead of offline ones")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["AI_CHAT_DB"] = os.path.join(directory, "bench.db")
+        if not args.live:
+            os.environ.update({"LLM_BACKEND": "fake", "EMBEDDINGS_BACKEND": "hashing"})
+        from backends.ai_backend import ChatAI
+        from backends.offline import FakeStreamingChatModel
+        from backends.router import SMALL, ModelRouter, create_policy
+        from utils.db_utils import close_connections, init_db
+
+        init_db()
+        questions = load_questions(args.questions)
+        if args.live:
+            engine = ChatAI(persist_directory=directory)
+            small = engine.create_router().models[SMALL]
+        else:
+            large = FakeStreamingChatModel(model="fake-chat", first_token_latency=0.05, tokens_per_second=400)
+            engine = ChatAI(llm=large, persist_directory=directory)
+            small = (FakeStreamingChatModel(model="fake-chat-small", first_token_latency=0.01, tokens_per_second=2000),
+                     "fake-chat-small")
+
+        engine.lookup_cached_answer = lambda query, model_name=None: None
+        engine.remember_answer = lambda query, answer, model_name=None: None
+        engine.router = None
+        baseline = summarize("large", run(engine, questions))
+
+        engine.router = ModelRouter(small, (engine.llm, engine.model_name), policy=create_policy(args.policy),
+                                    lexical_index=engine.get_lexical_index)
+        routed = summarize("routed", run(engine, questions))
+        print(f"speedup {baseline / routed:.2f}x\n")
+
+        for question, messages in questions:
+            history, standalone = engine.prepare_question(question, "bench", messages)
+            print(f"  {engine.router.route(standalone, history):<6} {question}")
+        stats = engine.router.stats()
+        print(f"\nescalation rate {stats['escalation_rate']:.0%} of {stats['requests']} questions")
+        for route, route_stats in stats["routes"].items():
+            print(f"  {route:<6} {route_stats}")
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
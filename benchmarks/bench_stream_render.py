@@ -0,0 +1,135 @@
+"""Browser frames and server CPU per chat answer: old turn flow vs the current chat page.
+
+    python -m benchmarks.bench_stream_render [--turns 5] [--answer-tokens 300] [--tokens-per-second 200]
+
+Both pages run under streamlit's AppTest with the offline backends. Every
+ForwardMsg the script enqueues for the browser is counted (a frame) along
+with its serialized size. "legacy" is the previous flow: st.rerun after the
+question, the whole answer re-rendered on every token, st.rerun after the
+answer. "current" is pages/chat_page.py with utils/stream_renderer.py.
+CPU is process time for the turn, so it includes retrieval and the fake
+LLM, which are the same for both.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEGACY_PAGE = """
+import sys
+sys.path.insert(0, {root!r})
+import streamlit as st
+from backends.ai_backend import get_engine
+from utils.db_utils import save_message_async
+
+st.session_state.setdefault("username", "bench")
+st.session_state.setdefault("messages", [])
+st.session_state.runs = st.session_state.get("runs", 0) + 1
+prompt = st.chat_input("Ask me anything about CSC Department...")
+if prompt:
+    st.session_state.messages.append({{"role": "user", "content": prompt, "timestamp": "12:00"}})
+    save_message_async("bench", "user", prompt, "12:00")
+    st.rerun()
+for message in st.session_state.messages[-30:]:
+    st.markdown(f'<div class="message-container"><div class="assistant-message">'
+                f'<div class="timestamp">12:00</div>{{message["content"]}}</div></div>', unsafe_allow_html=True)
+if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
+    placeholder = st.empty()
+    full_response = ""
+    for chunk in get_engine().stream_answer(st.session_state.messages[-1]["content"], username="bench",
+                                            messages=st.session_state.messages[:-1]):
+        full_response += chunk
+        placeholder.markdown(f'<div class="message-container"><div class="assistant-message">'
+                             f'<div class="timestamp">12:00</div>{{full_response}}</div></div>',
+                             unsafe_allow_html=True)
+    st.session_state.messages.append({{"role": "assistant", "content": full_response, "timestamp": "12:00"}})
+    save_message_async("bench", "assistant", full_response, "12:00")
+    st.rerun()
+"""
+
+CURRENT_PAGE = """
+import sys
+sys.path.insert(0, {root!r})
+import streamlit as st
+from pages import chat_page
+
+st.session_state.setdefault("username", "bench")
+st.session_state.setdefault("authenticated", True)
+st.session_state.runs = st.session_state.get("runs", 0) + 1
+chat_page.show()
+"""
+
+
+class FrameCounter:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def __call__(self, msg):
+        if msg.WhichOneof("type") == "delta":
+            self.frames += 1
+            self.bytes += msg.ByteSize()
+
+
+def run(kind: str, page: str, turns: int, counter: FrameCounter) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(page, default_timeout=120)
+    app.run()
+    rows = []
+    for turn in range(turns):
+        counter.frames = counter.bytes = 0
+        runs = app.session_state["runs"]
+        cpu, wall = time.process_time(), time.perf_counter()
+        app.chat_input[0].set_value(f"Tell me about course CSC {101 + turn} and {kind} lecturers").run()
+        rows.append({
+            "frames": counter.frames,
+            "kb": counter.bytes / 1024,
+            "reruns": app.session_state["runs"] - runs,
+            "cpu_ms": (time.process_time() - cpu) * 1000,
+            "wall_s": time.perf_counter() - wall,
+        })
+    return {key: sum(row[key] for row in rows) / len(rows) for key in rows[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--answer-tokens", type=int, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="bench-stream-")
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "EMBEDDINGS_BACKEND": "hashing",
+        "FAKE_LLM_LATENCY": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+        "SEMANTIC_CACHE_THRESHOLD": "2",  # every question is generated, never replayed
+        "AI_CHAT_DB": os.path.join(directory, "bench.db"),
+    })
+    os.chdir(directory)
+    sys.path.insert(0, ROOT)
+    from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+    from utils.db_utils import init_db
+
+    init_db()
+    counter = FrameCounter()
+    ForwardMsgQueue._before_enqueue_msg = counter
+
+    print(f"{'page':<8} {'frames':>7} {'KB sent':>8} {'reruns':>7} {'CPU ms':>8} {'wall s':>7}  (per answer)")
+    for kind, source in (("legacy", LEGACY_PAGE), ("current", CURRENT_PAGE)):
+        page = os.path.join(directory, f"{kind}_page.py")
+        with open(page, "w") as f:
+            f.write(source.format(root=ROOT))
+        result = run(kind, page, args.turns, counter)
+        print(f"{kind:<8} {result['frames']:>7.0f} {result['kb']:>8.1f} {result['reruns']:>7.1f} "
+              f"{result['cpu_ms']:>8.0f} {result['wall_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Chroma vs the memory-mapped NumPy store: load time, memory and query latency.
+
+    python -m benchmarks.bench_vectorstore [--sizes 1000 5000] [--dim 1024]
+
+Each store is built once from synthetic ~500 character chunks with a
+deterministic fake embedder, then reopened in a fresh interpreter so load
+time, import cost and resident memory are measured from a cold process.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS = ("course lecturer room admission diploma computer science department office hour "
+         "exam timetable project laboratory semester unit credit student library").split()
+
+
+def synthetic_chunks(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(70)) + f" csc{index}" for index in range(count)]
+
+
+def build(kind: str, directory: str, texts, dim: int) -> float:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    ids = [str(index) for index in range(len(texts))]
+    start = time.perf_counter()
+    if kind == "chroma":
+        from langchain_chroma import Chroma
+        Chroma.from_texts(texts, embeddings, ids=ids, persist_directory=directory)
+    else:
+        from backends.numpy_store import NumpyVectorStore
+        NumpyVectorStore.from_texts(texts, embeddings, ids=ids, persist_directory=directory, quantize=kind == "numpy-int8")
+    return time.perf_counter() - start
+
+
+def resident_mb() -> float:
+    # ru_maxrss survives exec on Linux, so read the current resident set instead
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def probe(kind: str, directory: str, dim: int, queries: int) -> dict:
+    """Runs in a fresh interpreter: open the store and time queries."""
+    rss_before = resident_mb()
+    start = time.perf_counter()
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    if kind == "chroma":
+        from langchain_chroma import Chroma
+        store = Chroma(embedding_function=embeddings, persist_directory=directory)
+    else:
+        from backends.numpy_store import NumpyVectorStore
+        store = NumpyVectorStore(embeddings, directory)
+    store.similarity_search("warm up", k=5)
+    load_seconds = time.perf_counter() - start
+
+    vectors = [embeddings.embed_query(f"question {index}") for index in range(queries)]
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(vector, k=5)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "load_ms": load_seconds * 1000,
+        "query_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "query_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "rss_mb": resident_mb() - rss_before,
+    }
+
+
+def directory_size_mb(directory: str) -> float:
+    total = 0
+    for root, _, names in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total / 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--dim", type=int, default=1024, help="embed-english-v3.0 returns 1024 dimensions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--kinds", nargs="+", default=["chroma", "numpy", "numpy-int8"])
+    parser.add_argument("--probe", nargs=2, metavar=("KIND", "DIRECTORY"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        print(json.dumps(probe(args.probe[0], args.probe[1], args.dim, args.queries)))
+        return
+
+    print(f"{'store':<11} {'chunks':>7} {'build s':>8} {'disk MB':>8} {'load ms':>8} {'rss MB':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for size in args.sizes:
+        texts = synthetic_chunks(size)
+        for kind in args.kinds:
+            with tempfile.TemporaryDirectory() as directory:
+                build_seconds = build(kind, directory, texts, args.dim)
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_vectorstore", "--dim", str(args.dim),
+                     "--queries", str(args.queries), "--probe", kind, directory],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{kind:<11} {size:>7} {build_seconds:>8.2f} {directory_size_mb(directory):>8.1f} "
+                      f"{result['load_ms']:>8.1f} {result['rss_mb']:>7.1f} "
+                      f"{result['query_p50_ms']:>7.3f} {result['query_p95_ms']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
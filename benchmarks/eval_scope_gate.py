@@ -0,0 +1,99 @@
+"""Evaluate and calibrate the scope gate on a labelled question set.
+
+    python -m benchmarks.eval_scope_gate [--questions benchmarks/scope_questions.jsonl] [--sweep] [--live]
+
+Each line of the question set is {"question": ..., "label": ...} with label
+in_scope, out_of_scope or not_in_kb. Thresholds come from the same
+SCOPE_GATE_* environment variables ChatAI uses. Reported:
+  confusion      label x gate verdict
+  short-circuit  share of questions answered with a canned reply (no LLM call)
+  blocked        in-scope questions wrongly given a canned reply (should be 0)
+  without embedding  share of questions decided by word coverage alone
+--sweep tries a grid of relevance thresholds and lists the settings with the
+most short-circuits that block no in-scope question. Offline backends are used
+unless --live is passed; their scores are not comparable with a real
+embedding model, so calibrate with the embeddings you deploy.
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+from collections import Counter
+
+LABELS = ("in_scope", "out_of_scope", "not_in_kb")
+
+
+def evaluate(gate, rows, signals):
+    from backends.scope_gate import CANNED_RESPONSES, IN_SCOPE
+
+    confusion = Counter()
+    canned = blocked = correct_canned = lexical_only = 0
+    for row, signal in zip(rows, signals):
+        lexical_verdict = gate.decide(dict(signal, relevance=None))
+        verdict = gate.decide(signal)
+        confusion[(row["label"], verdict)] += 1
+        lexical_only += lexical_verdict != "unsure"
+        if verdict in CANNED_RESPONSES:
+            canned += 1
+            correct_canned += verdict == row["label"]
+            blocked += row["label"] == IN_SCOPE
+    return {
+        "confusion": confusion,
+        "short_circuit": canned / len(rows),
+        "canned_precision": correct_canned / canned if canned else 1.0,
+        "blocked": blocked,
+        "lexical_only": lexical_only / len(rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=os.path.join(os.path.dirname(__file__), "scope_questions.jsonl"))
+    parser.add_argument("--sweep", action="store_true", help="search relevance thresholds")
+    parser.add_argument("--live", action="store_true", help="use the configured backends instead of offline ones")
+    args = parser.parse_args(argv)
+
+    if not args.live:
+        os.environ.update({"LLM_BACKEND": "fake", "EMBEDDINGS_BACKEND": "hashing"})
+    from backends.ai_backend import ChatAI
+
+    with open(args.questions) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = ChatAI(persist_directory=directory)
+        gate = engine.get_scope_gate()
+        signals = [gate.signals(row["question"]) for row in rows]
+
+        print(f"{'label':<13} {'verdict':<13} {'coverage':>8} {'relevance':>9}  question")
+        for row, signal in zip(rows, signals):
+            coverage = "-" if signal["coverage"] is None else f"{signal['coverage']:.2f}"
+            print(f"{row['label']:<13} {gate.decide(signal):<13} {coverage:>8} {signal['relevance']:>9.3f}  "
+                  f"{row['question']}")
+
+        result = evaluate(gate, rows, signals)
+        verdicts = ("in_scope", "out_of_scope", "not_in_kb", "unsure")
+        print(f"\n{'':<13}" + "".join(f"{verdict:>13}" for verdict in verdicts))
+        for label in LABELS:
+            print(f"{label:<13}" + "".join(f"{result['confusion'][(label, verdict)]:>13}" for verdict in verdicts))
+        print(f"\nshort-circuit {result['short_circuit']:.0%}  canned precision {result['canned_precision']:.0%}  "
+              f"in-scope blocked {result['blocked']}  decided without embedding {result['lexical_only']:.0%}")
+
+        if args.sweep:
+            relevances = sorted({round(signal["relevance"], 3) for signal in signals} | {0.0, 1.0})
+            candidates = []
+            for relevance_out, relevance_kb in itertools.product(relevances, relevances):
+                gate.relevance_out, gate.relevance_kb = relevance_out, relevance_kb
+                swept = evaluate(gate, rows, signals)
+                if swept["blocked"] == 0:
+                    candidates.append((swept["short_circuit"], swept["canned_precision"], relevance_out, relevance_kb))
+            # Most short-circuits first; among equals the lowest (most conservative) thresholds
+            candidates.sort(key=lambda candidate: (-candidate[0], -candidate[1], candidate[2], candidate[3]))
+            print("\nbest thresholds blocking no in-scope question:")
+            for short_circuit, precision, relevance_out, relevance_kb in candidates[:5]:
+                print(f"  SCOPE_GATE_RELEVANCE_OUT={relevance_out} SCOPE_GATE_RELEVANCE_KB={relevance_kb}  "
+                      f"short-circuit {short_circuit:.0%}  canned precision {precision:.0%}")
+
+
+if __name__ == "__main__":
+    main()
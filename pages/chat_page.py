@@ -1,46 +1,90 @@
 import streamlit as st
-from utils.db_utils import get_user_profile, get_user_messages, save_message, clear_user_messages
-from backends.ai_backend import ChatAI
+from utils.db_utils import get_user_profile, get_user_messages_page, save_message_async, clear_user_messages
+from backends.ai_backend import get_engine
+from backends.coalesce import Cancelled
+from utils.session_store import sessions
+from utils.session_watch import SessionWatch
+from utils.stream_renderer import StreamRenderer
 import datetime
 import os
 
+# Messages fetched per "load older" click, and messages rendered by default
+HISTORY_PAGE_SIZE = 50
+RENDER_WINDOW = 30
+# Keep what was streamed of an answer the student walked away from, marked as cut short
+SAVE_PARTIAL_ANSWERS = os.getenv('SAVE_PARTIAL_ANSWERS', '0') == '1'
+TRUNCATED_MARKER = "\n\n_(answer stopped)_"
+
 def logout():
-    """Log out user and clear session cookie"""
+    """Log out user and end the server-side session"""
+    token = st.session_state.get('session_token')
+    if token:
+        sessions.revoke(token)
     st.session_state.clear()
-    # Remove session cookie file
-    if os.path.exists(".session_cookie"):
-        try:
-            os.remove(".session_cookie")
-        except:
-            pass  # If there's any error, just proceed with logout
     st.rerun()
 
+def save_partial_answer(text, timestamp):
+    """Record an interrupted answer so the conversation still reads in order"""
+    message = {"role": "assistant", "content": text + TRUNCATED_MARKER, "timestamp": timestamp}
+    st.session_state.messages.append(message)
+    message["id"] = save_message_async(st.session_state['username'], message["role"], message["content"],
+                                       message["timestamp"])
+
+def add_welcome_message():
+    """Start an empty history with a greeting"""
+    welcome_message = {
+        "role": "assistant",
+        "content": f"Hello {st.session_state['username']}! How can I help you today?",
+        "timestamp": datetime.datetime.now().strftime("%H:%M")
+    }
+    welcome_message["id"] = save_message_async(
+        st.session_state['username'],
+        welcome_message["role"],
+        welcome_message["content"],
+        welcome_message["timestamp"]
+    )
+    st.session_state.messages = [welcome_message]
+    st.session_state.has_older_messages = False
+    st.session_state.render_window = RENDER_WINDOW
+
+def message_id(message):
+    """Database id of a message; messages still queued for writing hold a Future of it"""
+    value = message["id"]
+    return value.result() if hasattr(value, "result") else value
+
+def load_older_messages():
+    """Widen the render window, fetching the next page from the database when needed"""
+    messages = st.session_state.messages
+    if len(messages) <= st.session_state.render_window and st.session_state.has_older_messages:
+        older, has_older = get_user_messages_page(
+            st.session_state['username'], before_id=message_id(messages[0]), limit=HISTORY_PAGE_SIZE
+        )
+        st.session_state.messages = older + messages
+        st.session_state.has_older_messages = has_older
+    st.session_state.render_window += HISTORY_PAGE_SIZE
+
+def trim_history():
+    """Keep only the latest window in session memory; older messages stay in the database"""
+    st.session_state.render_window = RENDER_WINDOW
+    if len(st.session_state.messages) > RENDER_WINDOW:
+        st.session_state.messages = st.session_state.messages[-RENDER_WINDOW:]
+        st.session_state.has_older_messages = True
+
 def show():
     """Display the chat interface with improved UI."""
     # Now the sidebar will only show on this page
     if 'messages' not in st.session_state:
-        # Load messages from database
-        loaded_messages = get_user_messages(st.session_state['username'])
+        # Load the latest page of messages from database
+        loaded_messages, has_older = get_user_messages_page(st.session_state['username'], limit=RENDER_WINDOW)
         
         if loaded_messages:
             # Use messages from database
             st.session_state.messages = loaded_messages
+            st.session_state.has_older_messages = has_older
+            st.session_state.render_window = RENDER_WINDOW
         else:
             # Initialize with welcome message if no messages found
-            st.session_state.messages = []
-            welcome_message = {
-                "role": "assistant",
-                "content": f"Hello {st.session_state['username']}! How can I help you today?",
-                "timestamp": datetime.datetime.now().strftime("%H:%M")
-            }
-            st.session_state.messages.append(welcome_message)
-            # Save welcome message to database
-            save_message(
-                st.session_state['username'],
-                welcome_message["role"],
-                welcome_message["content"],
-                welcome_message["timestamp"]
-            )
+            add_welcome_message()
 
     # Custom CSS for message alignment
     st.markdown("""
@@ -68,6 +112,15 @@ def show():
             float: right;
             clear: both;
         }
+        .st-key-streaming-answer {
+            background-color: #f0f2f6;
+            border-radius: 15px;
+            padding: 10px 15px;
+            color: black;
+            margin: 5px 0 15px 0;
+            max-width: 80%;
+            gap: 0;
+        }
         .timestamp {
             font-size: 0.8em;
             opacity: 0.7;
@@ -97,19 +150,7 @@ def show():
         # Add a button to clear chat history
         if st.button("Clear Chat History", use_container_width=True):
             clear_user_messages(st.session_state['username'])
-            st.session_state.messages = []
-            welcome_message = {
-                "role": "assistant",
-                "content": f"Hello {st.session_state['username']}! How can I help you today?",
-                "timestamp": datetime.datetime.now().strftime("%H:%M")
-            }
-            st.session_state.messages.append(welcome_message)
-            save_message(
-                st.session_state['username'],
-                welcome_message["role"],
-                welcome_message["content"],
-                welcome_message["timestamp"]
-            )
+            add_welcome_message()
             st.rerun()
             
         st.markdown("---")
@@ -142,19 +183,21 @@ def show():
         st.session_state.messages.append(user_message)
         
         # Save user message to database
-        save_message(
+        user_message["id"] = save_message_async(
             st.session_state['username'],
             user_message["role"],
             user_message["content"],
             user_message["timestamp"]
         )
-        
-        # Rerun to display the user message immediately
-        st.rerun()
+        trim_history()
     
     # Display chat messages using custom HTML
     with chat_container:
-        for i, message in enumerate(st.session_state.messages):
+        hidden = len(st.session_state.messages) > st.session_state.render_window
+        if hidden or st.session_state.has_older_messages:
+            if st.button("Load older messages", key="load_older"):
+                load_older_messages()
+        for i, message in enumerate(st.session_state.messages[-st.session_state.render_window:]):
             role = message["role"]
             content = message["content"]
             timestamp = message["timestamp"]
@@ -173,45 +216,38 @@ def show():
                 </div>
             """, unsafe_allow_html=True)
     
-    # Check if we need to generate an AI response
-    # This happens after a user message has been added and the page has been rerun
+    # Answer the latest user message in this same run, below the history,
+    # so a question costs a single rerun (the one chat_input triggers)
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
-        # Create placeholder for streaming response
-        response_placeholder = st.empty()
-        
-        with response_placeholder:
+        with chat_container:
             with st.spinner("AI is thinking..."):
-                st.session_state.setdefault('ai_engine', ChatAI())
-                
-                # Implement streaming response
-                full_response = ""
+                ai_engine = get_engine()
                 timestamp = datetime.datetime.now().strftime("%H:%M")
-                
-                # Option 1: Using streaming if your ChatAI supports it
+                renderer = StreamRenderer(timestamp)
+                watch = SessionWatch()
                 try:
-                    # If streaming is supported
-                    message_placeholder = st.empty()
-                    for chunk in st.session_state.ai_engine._stream_response(
-                        st.session_state.ai_engine.setup_qa_chain(
-                            st.session_state.ai_engine.create_vectorstore()
-                        ), 
-                        st.session_state.messages[-1]["content"]
+                    for chunk in ai_engine.stream_answer(
+                        st.session_state.messages[-1]["content"],
+                        username=st.session_state['username'],
+                        messages=st.session_state.messages[:-1],
+                        cancelled=watch.abandoned,
                     ):
-                        full_response += chunk
-                        message_placeholder.markdown(f"""
-                            <div class="message-container">
-                                <div class="assistant-message">
-                                    <div class="timestamp">{timestamp}</div>
-                                    {full_response}
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
+                        renderer.write(chunk)
+                    full_response = renderer.close()
+                except Cancelled:
+                    # New message, button click or closed tab: the generation has been
+                    # aborted, so don't finish rendering or save a stale answer
+                    print(f"Answer abandoned ({watch.reason}) after {len(renderer.text)} characters")
+                    if SAVE_PARTIAL_ANSWERS and renderer.text.strip():
+                        save_partial_answer(renderer.text, timestamp)
+                    return
                 except Exception as e:
-                    # Fall back to non-streaming if there's an error
-                    print(f"Streaming not available: {e}")
-                    full_response = st.session_state.ai_engine.ask_question(
-                        st.session_state.messages[-1]["content"]
-                    )
+                    # The engine already retried within its deadlines, so asking again would
+                    # only double the wait; finish with the degraded reply instead
+                    print(f"Streaming failed: {e}")
+                    renderer.write(ai_engine.degraded_answer(st.session_state.messages[-1]["content"],
+                                                             partial=renderer.text))
+                    full_response = renderer.close()
         
         # Add the complete AI response to the session state
         ai_message = {
@@ -222,12 +258,12 @@ def show():
         st.session_state.messages.append(ai_message)
         
         # Save AI response to database
-        save_message(
+        ai_message["id"] = save_message_async(
             st.session_state['username'],
             ai_message["role"],
             ai_message["content"],
             ai_message["timestamp"]
         )
-        
-        # Rerun to update UI
-        st.rerun()
\ No newline at end of file
+        trim_history()
+        # Fold older turns into the conversation summary off the request path
+        ai_engine.memory.update_async(st.session_state['username'])
@@ -1,6 +1,30 @@
 # pages/login_page.py
 import streamlit as st
-from utils.auth_utils import authenticate_user
+from streamlit.runtime import Runtime, exists
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.auth_utils import authenticate_user, client_address, LoginThrottled
+from utils.session_store import sessions
+
+# Set once the missing private session manager has been reported
+_session_mgr_missing_logged = False
+
+def peer_address():
+    """Address of the connection the browser session came in on (Streamlit doesn't expose it publicly)"""
+    global _session_mgr_missing_logged
+    ctx = get_script_run_ctx()
+    if ctx is None or not exists():
+        return None
+    session_mgr = getattr(Runtime.instance(), "_session_mgr", None)
+    if session_mgr is None:
+        if not _session_mgr_missing_logged:
+            _session_mgr_missing_logged = True
+            print("Login: this Streamlit version has no Runtime._session_mgr; "
+                  "login attempts are throttled per username only")
+        return None
+    try:
+        return session_mgr.get_session_info(ctx.session_id).client.request.remote_ip
+    except AttributeError:
+        return None
 
 def show():
     """Display the login page."""
@@ -19,12 +43,20 @@ def show():
                 register_button = st.form_submit_button("Create Account", use_container_width=True)
         
         if submit:
-            if authenticate_user(username, password):
+            try:
+                # X-Forwarded-For only counts when set by a proxy listed in TRUSTED_PROXIES
+                client = client_address(peer_address(), st.context.headers.get("X-Forwarded-For", ""))
+                authenticated = authenticate_user(username, password, client)
+            except LoginThrottled as e:
+                st.error(str(e))
+                authenticated = None
+            if authenticated:
                 st.session_state['authenticated'] = True
                 st.session_state['username'] = username
-                # Authentication saved in main app.py
+                st.session_state['session_token'] = sessions.create(username)
+                # Session bound to the browser in main app.py
                 st.rerun()
-            else:
+            elif authenticated is False:
                 st.error("Invalid username or password")
         
         if register_button:
@@ -1,6 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import bcrypt
 from .db_utils import add_user, get_user_password
 
+# bcrypt verifications allowed at once per process, and how long a login waits for a slot
+LOGIN_MAX_INFLIGHT = int(os.getenv('LOGIN_MAX_INFLIGHT', str(max(1, (os.cpu_count() or 2) // 2))))
+LOGIN_QUEUE_TIMEOUT = float(os.getenv('LOGIN_QUEUE_TIMEOUT', '5'))
+# Failed attempts allowed per username / client before backing off, and the longest backoff
+LOGIN_FREE_FAILURES = int(os.getenv('LOGIN_FREE_FAILURES', '5'))
+LOGIN_MAX_BACKOFF = float(os.getenv('LOGIN_MAX_BACKOFF', '300'))
+# Addresses of the reverse proxies whose X-Forwarded-For header is believed (comma-separated)
+TRUSTED_PROXIES = {address.strip() for address in os.getenv('TRUSTED_PROXIES', '').split(',') if address.strip()}
+
+
+class LoginThrottled(Exception):
+    """Raised instead of checking a password while the caller is backing off or logins are saturated."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many login attempts, try again in {int(retry_after) + 1} seconds")
+        self.retry_after = retry_after
+
+
+class LoginThrottle:
+    """Counts recent failures per key and locks a key out for exponentially longer after each one."""
+
+    def __init__(self, free_failures=LOGIN_FREE_FAILURES, max_backoff=LOGIN_MAX_BACKOFF, max_keys=10000):
+        self.free_failures = free_failures
+        self.max_backoff = max_backoff
+        self.max_keys = max_keys
+        self._failures = OrderedDict()  # key -> (failures, locked_until)
+        self._lock = threading.Lock()
+
+    def retry_after(self, keys):
+        """Seconds until every key may try again (0 when none is locked out)."""
+        now = time.monotonic()
+        with self._lock:
+            return max([self._failures.get(key, (0, 0))[1] - now for key in keys] + [0])
+
+    def failed(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                failures = self._failures.pop(key, (0, 0))[0] + 1
+                excess = failures - self.free_failures
+                locked_until = now + min(2 ** excess, self.max_backoff) if excess > 0 else 0
+                self._failures[key] = (failures, locked_until)
+            if len(self._failures) > self.max_keys:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Forget the oldest keys that are not locked out; locked keys stay until their backoff ends"""
+        excess = len(self._failures) - self.max_keys
+        for key in [key for key, (_, locked_until) in self._failures.items() if locked_until <= now][:excess]:
+            del self._failures[key]
+
+    def succeeded(self, keys):
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+login_throttle = LoginThrottle()
+_verifications = threading.BoundedSemaphore(LOGIN_MAX_INFLIGHT)
+
+def client_address(peer, forwarded_for=""):
+    """The address a request came from. X-Forwarded-For is only read when the connection
+    comes from one of TRUSTED_PROXIES, and then the nearest address they did not add is used."""
+    if not peer or peer not in TRUSTED_PROXIES:
+        return peer
+    for address in reversed([address.strip() for address in forwarded_for.split(",") if address.strip()]):
+        if address not in TRUSTED_PROXIES:
+            return address
+    return peer
+
 def hash_password(password):
     """Hash a password using bcrypt."""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
@@ -14,9 +89,29 @@ def register_user(name, email, phone, username, password):
     hashed_pw = hash_password(password)
     return add_user(name, email, phone, username, hashed_pw)
 
-def authenticate_user(username, password):
-    """Authenticate a user by username and password."""
+def authenticate_user(username, password, client=None):
+    """Authenticate a user by username and password.
+
+    Raises LoginThrottled while the username (or client, e.g. an IP address)
+    is backing off after repeated failures, or when no bcrypt slot frees up
+    within LOGIN_QUEUE_TIMEOUT.
+    """
+    keys = [f"user:{username}"] + ([f"client:{client}"] if client else [])
+    retry_after = login_throttle.retry_after(keys)
+    if retry_after > 0:
+        raise LoginThrottled(retry_after)
     hashed_password = get_user_password(username)
-    if hashed_password and verify_password(password, hashed_password):
+    if not hashed_password:
+        login_throttle.failed(keys)
+        return False
+    if not _verifications.acquire(timeout=LOGIN_QUEUE_TIMEOUT):
+        raise LoginThrottled(1)
+    try:
+        verified = verify_password(password, hashed_password)
+    finally:
+        _verifications.release()
+    if verified:
+        login_throttle.succeeded(keys)
         return True
+    login_throttle.failed(keys)
     return False
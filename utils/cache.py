@@ -0,0 +1,82 @@
+"""Small in-process read-through cache for database lookups.
+
+    @ttl_cache(ttl=60)
+    def get_user_profile(username): ...
+
+    get_user_profile.invalidate("ada")   # after a write
+    get_user_profile.cache_clear()
+
+Entries expire after `ttl` seconds, which also bounds how stale a value
+written by another process can be; writers in this process invalidate
+explicitly. A None result ("no such row") is not cached, so a row another
+process inserts shows up on the next call. The least recently used entry is
+evicted beyond max_entries.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl=60.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def ttl_cache(ttl=60.0, max_entries=1024):
+    """Cache a function's results, other than None, by its positional arguments."""
+    def decorator(func):
+        cache = TTLCache(ttl, max_entries)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = cache.get(args)
+            if value is _MISSING:
+                value = func(*args)
+                if value is not None:
+                    cache.set(args, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.invalidate = lambda *args: cache.invalidate(args)
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
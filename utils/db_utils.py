@@ -1,96 +1,431 @@
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 
+from . import telemetry
+from .cache import ttl_cache
+
+DB_PATH = os.getenv('AI_CHAT_DB', 'ai_chat.db')
+POOL_SIZE = 8
+WRITE_BATCH_SIZE = 64
+WRITE_FLUSH_INTERVAL = 0.05
+RESPONSE_CACHE_MAX_ROWS = 5000
+# Seconds a user row read is served from memory (bounds staleness across processes)
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',  # readers no longer block the writer (persists in the file)
+    'PRAGMA synchronous=NORMAL',  # fsync at checkpoints instead of every commit; safe with WAL
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Schema changes applied in order by init_db; the applied version is kept in PRAGMA user_version
+MIGRATIONS = [
+    (1, ['CREATE INDEX IF NOT EXISTS idx_messages_username_id ON messages (username, id)']),
+    (2, ['''CREATE TABLE IF NOT EXISTS conversation_summaries
+            (username TEXT PRIMARY KEY,
+             summary TEXT NOT NULL,
+             summarized_until_id INTEGER NOT NULL,
+             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''']),
+    (3, ['''CREATE TABLE IF NOT EXISTS sessions
+            (token_hash TEXT PRIMARY KEY,
+             username TEXT NOT NULL,
+             expires_at REAL NOT NULL,
+             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+         'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)']),
+]
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_lock = threading.Lock()
+_pool_path = None
+
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=5.0)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def get_connection(op=None):
+    """Borrow a pooled connection; commits on success and rolls back on error.
+
+    `op` names the query in the db_query telemetry stage.
+    """
+    global _pool_path
+    with _pool_lock:
+        if _pool_path != DB_PATH:
+            # The database file changed (e.g. in tests): drop connections to the old one
+            while not _pool.empty():
+                _pool.get_nowait().close()
+            _pool_path = DB_PATH
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    stage = telemetry.timed("db_query", op=op)
+    try:
+        with stage, conn:
+            yield conn
+    finally:
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def close_connections():
+    """Close every pooled connection (e.g. at shutdown)."""
+    while not _pool.empty():
+        _pool.get_nowait().close()
+
+
 def init_db():
     """Initialize the database and create tables if they don't exist."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  email TEXT UNIQUE NOT NULL,
-                  phone TEXT,
-                  username TEXT UNIQUE NOT NULL,
-                  password TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS messages
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT NOT NULL,
-                  role TEXT NOT NULL,
-                  content TEXT NOT NULL,
-                  timestamp TEXT NOT NULL,
-                  FOREIGN KEY (username) REFERENCES users(username))''')
-                  
-    conn.commit()
-    conn.close()
+    with get_connection('init_db') as conn:
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS users
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT NOT NULL,
+                      email TEXT UNIQUE NOT NULL,
+                      phone TEXT,
+                      username TEXT UNIQUE NOT NULL,
+                      password TEXT NOT NULL,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS messages
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      username TEXT NOT NULL,
+                      role TEXT NOT NULL,
+                      content TEXT NOT NULL,
+                      timestamp TEXT NOT NULL,
+                      FOREIGN KEY (username) REFERENCES users(username))''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS response_cache
+                     (cache_key TEXT PRIMARY KEY,
+                      question TEXT NOT NULL,
+                      answer TEXT NOT NULL,
+                      model TEXT NOT NULL,
+                      corpus_version TEXT,
+                      hits INTEGER NOT NULL DEFAULT 0,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used_at)')
+
+    migrate_db()
+
+
+def migrate_db():
+    """Apply the migrations newer than the database's user_version."""
+    with get_connection('migrate_db') as conn:
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept parameters; version is an int from MIGRATIONS
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+
 
 def add_user(name, email, phone, username, password_hash):
     """Add a new user to the database."""
     try:
-        conn = sqlite3.connect('ai_chat.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO users (name, email, phone, username, password) VALUES (?, ?, ?, ?, ?)',
-                  (name, email, phone, username, password_hash))
-        conn.commit()
+        with get_connection('add_user') as conn:
+            conn.execute('INSERT INTO users (name, email, phone, username, password) VALUES (?, ?, ?, ?, ?)',
+                         (name, email, phone, username, password_hash))
         return True
     except sqlite3.IntegrityError:
         return False
     finally:
-        conn.close()
+        invalidate_user(username)
 
+def invalidate_user(username):
+    """Drop cached reads of a user's row; call after writing to it."""
+    get_user_password.invalidate(username)
+    get_user_profile.invalidate(username)
+
+@ttl_cache(ttl=USER_CACHE_TTL)
 def get_user_password(username):
     """Get a user's password hash from the database."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('SELECT password FROM users WHERE username = ?', (username,))
-    result = c.fetchone()
-    conn.close()
+    with get_connection('get_user_password') as conn:
+        result = conn.execute('SELECT password FROM users WHERE username = ?', (username,)).fetchone()
     return result[0] if result else None
 
+@ttl_cache(ttl=USER_CACHE_TTL)
 def get_user_profile(username):
     """Get user profile information."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('SELECT name, email, phone FROM users WHERE username = ?', (username,))
-    result = c.fetchone()
-    conn.close()
+    with get_connection('get_user_profile') as conn:
+        result = conn.execute('SELECT name, email, phone FROM users WHERE username = ?', (username,)).fetchone()
     return result if result else None
 
 def save_message(username, role, content, timestamp):
-    """Save a message to the database."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('INSERT INTO messages (username, role, content, timestamp) VALUES (?, ?, ?, ?)',
-              (username, role, content, timestamp))
-    conn.commit()
-    conn.close()
+    """Save a message to the database and return its id."""
+    with get_connection('save_message') as conn:
+        cursor = conn.execute('INSERT INTO messages (username, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                              (username, role, content, timestamp))
+    return cursor.lastrowid
+
+
+class MessageWriter:
+    """Write-behind queue for chat messages.
+
+    Messages are committed by a background thread in batches of up to
+    `batch_size`, gathered for at most `flush_interval` seconds, so one commit
+    covers many inserts and the caller never waits for it. Readers in this
+    process call wait_for(username) first, which only blocks (and triggers an
+    immediate commit) while that user still has queued messages. Pending
+    messages are flushed at exit.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._pending = Counter()
+        self._condition = threading.Condition()
+        self._urgent = threading.Event()
+        self._thread = None
+
+    def submit(self, username, role, content, timestamp):
+        """Queue a message; the returned Future resolves to its row id once committed."""
+        future = Future()
+        with self._condition:
+            self._pending[username] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((username, role, content, timestamp, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size and not self._urgent.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=min(remaining, 0.005))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._urgent.clear()
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        try:
+            with get_connection('save_messages_batch') as conn:
+                ids = [
+                    conn.execute('INSERT INTO messages (username, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                                 row[:4]).lastrowid
+                    for row in batch
+                ]
+        except Exception as e:
+            for row in batch:
+                row[4].set_exception(e)
+        else:
+            for row, message_id in zip(batch, ids):
+                row[4].set_result(message_id)
+        with self._condition:
+            for row in batch:
+                self._pending[row[0]] -= 1
+                if self._pending[row[0]] <= 0:
+                    del self._pending[row[0]]
+            self._condition.notify_all()
+
+    def wait_for(self, username=None, timeout=None):
+        """Block until the user's (or everyone's) queued messages are committed."""
+        with self._condition:
+            if username is None:
+                done = lambda: not self._pending
+            else:
+                done = lambda: username not in self._pending
+            if done():
+                return True
+            # A reader is waiting: commit what is queued now instead of waiting out the interval
+            self._urgent.set()
+            return self._condition.wait_for(done, timeout)
+
+    def close(self, timeout=10):
+        """Flush everything queued and stop the writer thread."""
+        self.wait_for(timeout=timeout)
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+
+_message_writer = MessageWriter()
+atexit.register(_message_writer.close)
+
+
+def save_message_async(username, role, content, timestamp):
+    """Queue a message for a batched write; returns a Future of its id."""
+    return _message_writer.submit(username, role, content, timestamp)
+
+
+def flush_messages(username=None, timeout=None):
+    """Wait until queued messages (of one user, or all) are in the database."""
+    return _message_writer.wait_for(username, timeout)
 
 
 def get_user_messages(username):
     """Get all messages for a specific user."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('SELECT role, content, timestamp FROM messages WHERE username = ? ORDER BY id ASC', (username,))
-    messages = c.fetchall()
-    conn.close()
-    
-    # Convert to list of dictionaries
-    message_list = []
-    for msg in messages:
-        message_list.append({
-            "role": msg[0],
-            "content": msg[1],
-            "timestamp": msg[2]
-        })
-    
-    return message_list
+    flush_messages(username)
+    with get_connection('get_user_messages') as conn:
+        messages = conn.execute('SELECT role, content, timestamp FROM messages WHERE username = ? ORDER BY id ASC',
+                                (username,)).fetchall()
+    return [{"role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in messages]
+
+
+def get_user_messages_page(username, before_id=None, limit=50):
+    """Get up to `limit` of a user's messages older than before_id (the newest when None).
+
+    Returns (messages oldest first, whether older messages exist). Keyset
+    pagination on messages(username, id) keeps the cost independent of how
+    long the history is.
+    """
+    flush_messages(username)
+    with get_connection('get_user_messages_page') as conn:
+        if before_id is None:
+            rows = conn.execute('''SELECT id, role, content, timestamp FROM messages
+                                   WHERE username = ? ORDER BY id DESC LIMIT ?''',
+                                (username, limit + 1)).fetchall()
+        else:
+            rows = conn.execute('''SELECT id, role, content, timestamp FROM messages
+                                   WHERE username = ? AND id < ? ORDER BY id DESC LIMIT ?''',
+                                (username, before_id, limit + 1)).fetchall()
+    messages = [
+        {"id": message_id, "role": role, "content": content, "timestamp": timestamp}
+        for message_id, role, content, timestamp in reversed(rows[:limit])
+    ]
+    return messages, len(rows) > limit
+
+
+def get_user_messages_since(username, after_id=0, limit=50):
+    """Get up to `limit` of a user's messages newer than after_id, oldest first.
+
+    Returns (messages, whether more newer messages exist).
+    """
+    flush_messages(username)
+    with get_connection('get_user_messages_since') as conn:
+        rows = conn.execute('''SELECT id, role, content, timestamp FROM messages
+                               WHERE username = ? AND id > ? ORDER BY id ASC LIMIT ?''',
+                            (username, after_id, limit + 1)).fetchall()
+    messages = [
+        {"id": message_id, "role": role, "content": content, "timestamp": timestamp}
+        for message_id, role, content, timestamp in rows[:limit]
+    ]
+    return messages, len(rows) > limit
 
 
 def clear_user_messages(username):
     """Clear all messages for a user."""
-    conn = sqlite3.connect('ai_chat.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM messages WHERE username = ?', (username,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    flush_messages(username)
+    with get_connection('clear_user_messages') as conn:
+        conn.execute('DELETE FROM messages WHERE username = ?', (username,))
+        conn.execute('DELETE FROM conversation_summaries WHERE username = ?', (username,))
+
+
+def get_conversation_summary(username):
+    """Get (summary, id of the last message it covers) for a user; ("", 0) when none."""
+    with get_connection('get_conversation_summary') as conn:
+        result = conn.execute('SELECT summary, summarized_until_id FROM conversation_summaries WHERE username = ?',
+                              (username,)).fetchone()
+    return (result[0], result[1]) if result else ("", 0)
+
+
+def save_conversation_summary(username, summary, summarized_until_id):
+    """Store a user's rolling conversation summary."""
+    with get_connection('save_conversation_summary') as conn:
+        conn.execute('''INSERT INTO conversation_summaries (username, summary, summarized_until_id)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(username) DO UPDATE SET summary = excluded.summary,
+                            summarized_until_id = excluded.summarized_until_id,
+                            updated_at = CURRENT_TIMESTAMP''',
+                     (username, summary, summarized_until_id))
+
+
+def save_session(token_hash, username, expires_at):
+    """Store a login session; only a hash of its token is kept."""
+    with get_connection('save_session') as conn:
+        conn.execute('INSERT INTO sessions (token_hash, username, expires_at) VALUES (?, ?, ?)',
+                     (token_hash, username, expires_at))
+
+
+def get_session(token_hash):
+    """Get (username, expires_at) for a session, or None."""
+    with get_connection('get_session') as conn:
+        result = conn.execute('SELECT username, expires_at FROM sessions WHERE token_hash = ?',
+                              (token_hash,)).fetchone()
+    return result
+
+
+def delete_session(token_hash):
+    with get_connection('delete_session') as conn:
+        conn.execute('DELETE FROM sessions WHERE token_hash = ?', (token_hash,))
+
+
+def delete_expired_sessions(now):
+    """Remove sessions that expired before `now` (a Unix time); returns how many."""
+    with get_connection('delete_expired_sessions') as conn:
+        return conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,)).rowcount
+
+
+def get_cached_response(cache_key):
+    """Look up a cached answer and mark it as recently used."""
+    with get_connection('get_cached_response') as conn:
+        result = conn.execute('SELECT answer FROM response_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+        if result:
+            conn.execute('UPDATE response_cache SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP WHERE cache_key = ?',
+                         (cache_key,))
+    return result[0] if result else None
+
+
+def save_cached_response(cache_key, question, answer, model, corpus_version, max_rows=RESPONSE_CACHE_MAX_ROWS):
+    """Store an answer, evicting the least recently used rows beyond max_rows."""
+    with get_connection('save_cached_response') as conn:
+        conn.execute('''INSERT OR REPLACE INTO response_cache (cache_key, question, answer, model, corpus_version)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     (cache_key, question, answer, model, corpus_version))
+        conn.execute('''DELETE FROM response_cache WHERE cache_key IN
+                        (SELECT cache_key FROM response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)''',
+                     (max_rows,))
+
+
+def get_cached_responses():
+    """Get every cached answer, most recently used first."""
+    with get_connection('get_cached_responses') as conn:
+        rows = conn.execute('''SELECT cache_key, question, answer, model, corpus_version, hits
+                               FROM response_cache ORDER BY last_used_at DESC''').fetchall()
+    return [
+        {"cache_key": row[0], "question": row[1], "answer": row[2],
+         "model": row[3], "corpus_version": row[4], "hits": row[5]}
+        for row in rows
+    ]
+
+
+def clear_response_cache():
+    """Remove all cached answers."""
+    with get_connection('clear_response_cache') as conn:
+        conn.execute('DELETE FROM response_cache')
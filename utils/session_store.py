@@ -0,0 +1,89 @@
+"""Login sessions: random tokens with an expiry, kept in SQLite.
+
+The token is handed to the client (the Streamlit app keeps it in a
+cookie, the API returns it as a bearer token) and only its SHA-256 is stored.
+Validated sessions are kept in an in-memory LRU, so checking a token on
+every rerun is a dictionary lookup; the database is only consulted for
+tokens this process has not seen yet, and again every SESSION_RECHECK
+seconds so a logout in another process takes effect.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from .db_utils import delete_expired_sessions, delete_session, get_session, save_session
+
+SESSION_TTL = int(os.getenv('SESSION_TTL', str(12 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+SESSION_RECHECK = float(os.getenv('SESSION_RECHECK', '60'))
+# Expired rows are purged after this many new sessions
+PURGE_EVERY = 100
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL, max_cached=SESSION_CACHE_SIZE, recheck=SESSION_RECHECK):
+        self.ttl = ttl
+        self.max_cached = max_cached
+        self.recheck = recheck
+        self._cache = OrderedDict()  # token hash -> (username, expires_at, checked_at)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _remember(self, key, session):
+        with self._lock:
+            self._cache[key] = (*session, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def create(self, username, ttl=None):
+        """Start a session for username and return its token."""
+        token = secrets.token_urlsafe(32)
+        key = token_hash(token)
+        session = (username, time.time() + (ttl or self.ttl))
+        save_session(key, *session)
+        self._remember(key, session)
+        self._created += 1
+        if self._created % PURGE_EVERY == 0:
+            delete_expired_sessions(time.time())
+        return token
+
+    def validate(self, token):
+        """Return the username for a live session token, otherwise None."""
+        if not token:
+            return None
+        key = token_hash(token)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None and time.monotonic() - cached[2] < self.recheck:
+            username, expires_at = cached[:2]
+        else:
+            session = get_session(key)
+            if session is None:
+                with self._lock:
+                    self._cache.pop(key, None)
+                return None
+            self._remember(key, session)
+            username, expires_at = session
+        if expires_at < time.time():
+            self.revoke(token)
+            return None
+        return username
+
+    def revoke(self, token):
+        key = token_hash(token)
+        with self._lock:
+            self._cache.pop(key, None)
+        delete_session(key)
+
+
+sessions = SessionStore()
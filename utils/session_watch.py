@@ -0,0 +1,44 @@
+"""Tell whether anyone is still waiting for the current Streamlit run.
+
+A run is abandoned once the browser disconnects (tab closed, network gone)
+or the session asks for a rerun or stop, e.g. because the student sent
+another message or clicked a button. Streamlit only interrupts a run at its
+next st.* call, so a run blocked on a slow model would otherwise keep
+going; long waits poll `abandoned()` instead.
+"""
+from streamlit.runtime import Runtime, exists
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+
+# Set once the missing private request state has been reported
+_state_missing_logged = False
+
+
+class SessionWatch:
+    def __init__(self):
+        # Captured on the script thread; abandoned() may be called from any thread
+        self.ctx = get_script_run_ctx()
+        self.reason = None
+
+    def abandoned(self) -> bool:
+        if self.reason is not None:
+            return True
+        if self.ctx is None:
+            return False
+        if exists() and not Runtime.instance().is_active_session(self.ctx.session_id):
+            self.reason = "disconnected"
+            return True
+        # Pending requests are not exposed publicly; read the state without consuming it
+        state = getattr(self.ctx.script_requests, "_state", None)
+        if state is None:
+            global _state_missing_logged
+            if not _state_missing_logged:
+                _state_missing_logged = True
+                print("SessionWatch: this Streamlit version has no script_requests._state; "
+                      "reruns and stops won't cancel generations, only disconnects will")
+            return False
+        if state == ScriptRequestType.RERUN:
+            self.reason = "rerun"
+        elif state == ScriptRequestType.STOP:
+            self.reason = "stop"
+        return self.reason is not None
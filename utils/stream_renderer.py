@@ -0,0 +1,59 @@
+"""Incremental rendering of a streamed answer in the chat page.
+
+Updating one st.markdown with the whole answer on every token resends the
+answer so far each time (quadratic in its length). StreamRenderer instead
+flushes on a time or size cadence, and once a paragraph is complete it is
+left in its own element while later text goes into a new one, so each
+update only carries the paragraph being written.
+"""
+import time
+
+import streamlit as st
+
+
+class StreamRenderer:
+    def __init__(self, timestamp: str, key: str = "streaming-answer", interval: float = 0.1,
+                 max_pending: int = 200):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.text = ""
+        self.frames = 0
+        self.bytes_sent = 0
+        self._frozen = 0  # end of the text already rendered in finished paragraph elements
+        self._rendered = 0
+        self._last_flush = 0.0
+        self._container = st.container(key=key)
+        self._container.markdown(f'<div class="timestamp">{timestamp}</div>', unsafe_allow_html=True)
+        self._tail = self._container.empty()
+
+    def write(self, chunk: str):
+        self.text += chunk
+        pending = len(self.text) - self._rendered
+        if pending >= self.max_pending or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._rendered == len(self.text):
+            return
+        # Freeze complete paragraphs, but never split a fenced code block
+        boundary = self.text.rfind("\n\n", self._frozen)
+        while boundary != -1 and self.text.count("```", 0, boundary) % 2:
+            boundary = self.text.rfind("\n\n", self._frozen, boundary)
+        if boundary != -1:
+            self._update(self.text[self._frozen:boundary])
+            self._frozen = boundary + 2
+            self._tail = self._container.empty()
+        if self._frozen < len(self.text):
+            self._update(self.text[self._frozen:])
+        self._rendered = len(self.text)
+        self._last_flush = time.monotonic()
+
+    def _update(self, text: str):
+        self._tail.markdown(text)
+        self.frames += 1
+        self.bytes_sent += len(text.encode("utf-8"))
+
+    def close(self) -> str:
+        """Render whatever is still pending and return the full answer."""
+        self.flush()
+        return self.text
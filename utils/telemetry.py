@@ -0,0 +1,268 @@
+"""Tracing and latency histograms for the stages of a chat turn.
+
+    TELEMETRY=otlp                 spans and metrics to an OTLP collector
+                                   (OTEL_EXPORTER_OTLP_ENDPOINT, default localhost:4317)
+    TELEMETRY=prometheus           histograms in Prometheus text format, served by
+                                   api.py at /metrics and, with TELEMETRY_PROMETHEUS_PORT,
+                                   by a small HTTP server in the Streamlit process
+    TELEMETRY=otlp,prometheus      both
+
+Instrumented code uses
+
+    with telemetry.timed("retrieval", mode="hybrid") as stage:
+        ...
+        stage.set("cache", "hit")
+
+which opens a span and, on exit, records the duration in the
+chat_<name>_seconds histogram labelled with the string attributes. With
+TELEMETRY unset (the default) timed() hands back one shared no-op object,
+so disabled instrumentation costs a function call and a branch.
+"""
+import bisect
+import os
+import threading
+import time
+
+MODES = {mode.strip() for mode in os.getenv('TELEMETRY', '').lower().split(',') if mode.strip()}
+enabled = bool(MODES)
+SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'csc-ai-chat')
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NoopStage:
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+class Histograms:
+    """Cumulative latency histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}  # (name, labels) -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def render(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        lines = []
+        for name in sorted({name for name, _ in snapshot}):
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labels), series in sorted(snapshot.items()):
+                if series_name != name:
+                    continue
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                prefix = label_text + "," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {series[-2]}')
+                lines.append(f"{name}_count{{{label_text}}} {series[-2]}")
+                lines.append(f"{name}_sum{{{label_text}}} {series[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+histograms = Histograms() if "prometheus" in MODES else None
+_tracer = None
+_meter = None
+_otel_histograms = {}
+_otel_lock = threading.Lock()
+
+
+def _setup_otlp():
+    global _tracer, _meter
+    from opentelemetry import metrics, trace
+    from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    resource = Resource.create({"service.name": SERVICE_NAME})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(resource=resource,
+                                             metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())]))
+    _tracer = trace.get_tracer("csc-ai-chat")
+    _meter = metrics.get_meter("csc-ai-chat")
+
+
+def _otel_histogram(name):
+    with _otel_lock:
+        histogram = _otel_histograms.get(name)
+        if histogram is None:
+            histogram = _otel_histograms[name] = _meter.create_histogram(name, unit="s")
+        return histogram
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in the chat_<name>_seconds histogram."""
+    if not enabled:
+        return
+    metric = f"chat_{name}_seconds"
+    labels = {key: str(value) for key, value in labels.items() if value is not None}
+    if histograms is not None:
+        histograms.observe(metric, seconds, labels)
+    if _meter is not None:
+        _otel_histogram(metric).record(seconds, labels)
+
+
+class _Stage:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self._span_context = None
+        self._span = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+        if self._span is not None:
+            self._span.set_attribute(key, value)
+
+    def __enter__(self):
+        if _tracer is not None:
+            self._span_context = _tracer.start_as_current_span(self.name, attributes=self.attributes)
+            self._span = self._span_context.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        if self._span_context is not None:
+            self._span_context.__exit__(*exc)
+        labels = {key: value for key, value in self.attributes.items() if isinstance(value, str)}
+        if exc[0] is not None:
+            labels["error"] = exc[0].__name__
+        observe(self.name, elapsed, **labels)
+        return False
+
+
+def timed(name, **attributes):
+    """Span plus histogram around a block; string attributes become metric labels."""
+    if not enabled:
+        return _NOOP
+    return _Stage(name, attributes)
+
+
+class _NoopStream(_NoopStage):
+    def first_token(self):
+        pass
+
+
+_NOOP_STREAM = _NoopStream()
+
+
+class _StreamStage(_Stage):
+    ttft = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+            self.set("ttft_s", self.ttft)
+            labels = {key: value for key, value in self.attributes.items() if isinstance(value, str)}
+            observe(f"{self.name}_ttft", self.ttft, **labels)
+
+
+def timed_stream(name, **attributes):
+    """timed() for a token stream; call first_token() when the first piece arrives
+    to also record chat_<name>_ttft_seconds."""
+    if not enabled:
+        return _NOOP_STREAM
+    return _StreamStage(name, attributes)
+
+
+def instrument_embeddings(embeddings, model=None):
+    """Wrap an embeddings model so every call is timed; returned unchanged when disabled."""
+    if not enabled:
+        return embeddings
+    from langchain_core.embeddings import Embeddings
+
+    class TimedEmbeddings(Embeddings):
+        def __init__(self, inner):
+            self.inner = inner
+            self.model = getattr(inner, "model", None) or model
+
+        def embed_query(self, text):
+            with timed("embedding", call="query", model=self.model):
+                return self.inner.embed_query(text)
+
+        def embed_documents(self, texts):
+            with timed("embedding", call="documents", model=self.model) as stage:
+                stage.set("texts", len(texts))
+                return self.inner.embed_documents(texts)
+
+        async def aembed_query(self, text):
+            with timed("embedding", call="query", model=self.model):
+                return await self.inner.aembed_query(text)
+
+        async def aembed_documents(self, texts):
+            with timed("embedding", call="documents", model=self.model) as stage:
+                stage.set("texts", len(texts))
+                return await self.inner.aembed_documents(texts)
+
+        def __getattr__(self, name):
+            return getattr(self.inner, name)
+
+    return TimedEmbeddings(embeddings)
+
+
+def prometheus_text():
+    """Current histograms in the Prometheus exposition format, or None when not enabled."""
+    return histograms.render() if histograms is not None else None
+
+
+def _serve_prometheus(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+
+if "otlp" in MODES:
+    try:
+        _setup_otlp()
+    except Exception as e:
+        print(f"OTLP telemetry not available: {e}")
+if histograms is not None and os.getenv('TELEMETRY_PROMETHEUS_PORT'):
+    try:
+        _serve_prometheus(int(os.getenv('TELEMETRY_PROMETHEUS_PORT')))
+    except OSError as e:
+        print(f"Metrics endpoint not started: {e}")